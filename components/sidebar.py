@@ -431,18 +431,15 @@ def render_export_section(
         # Calculate metrics (safely handle empty dataframes)
         # Use FIFO-matched trades for consistent win rate and profit factor calculation
         if has_tradebook_data:
-            # Get matched trades for win rate and profit factor calculation
-            matched_trades = mc.match_trades_with_pnl(filtered_tradebook)
-            if len(matched_trades) > 0:
-                wins = sum(1 for _, pnl, _ in matched_trades if pnl > 0)
-                win_rate = (wins / len(matched_trades)) * 100
+            # Get matched trades' P&L for win rate and profit factor calculation
+            matched_pnl = mc.build_match_table(filtered_tradebook)['PnL']
+            if len(matched_pnl) > 0:
+                winning_trades = matched_pnl[matched_pnl > 0]
+                win_rate = (len(winning_trades) / len(matched_pnl)) * 100
                 
                 # Calculate profit factor from matched trades (not aggregated P&L)
-                winning_trades = [pnl for _, pnl, _ in matched_trades if pnl > 0]
-                losing_trades = [pnl for _, pnl, _ in matched_trades if pnl < 0]
-                
-                gross_profit = sum(winning_trades) if len(winning_trades) > 0 else 0
-                gross_loss = abs(sum(losing_trades)) if len(losing_trades) > 0 else 0
+                gross_profit = winning_trades.sum()
+                gross_loss = abs(matched_pnl[matched_pnl < 0].sum())
                 
                 if gross_loss > 0:
                     profit_factor = gross_profit / gross_loss
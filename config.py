@@ -13,6 +13,11 @@ TRADEBOOK_REQUIRED_COLUMNS = [
     'Trade ID', 'Order ID', 'Order Execution Time'
 ]
 
+# Date formats used in Zerodha tradebook exports (parsed with the fast path,
+# falling back to format inference if a file deviates)
+TRADEBOOK_DATE_FORMAT = '%Y-%m-%d'
+ORDER_EXECUTION_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
 PNL_REQUIRED_COLUMNS = [
     'Symbol', 'ISIN', 'Quantity', 'Buy Value', 'Sell Value', 
     'Realized P&L', 'Realized P&L Pct.'
@@ -28,6 +33,7 @@ RISK_FREE_RATE = 0.0
 # Performance analysis constants
 ROLLING_WINDOW_SIZE = 20  # Number of trades in rolling window for expectancy calculation
 QUANTILE_75TH = 0.75  # 75th percentile threshold for MAE/MFE analysis
+HOLDING_STYLE_MAX_DAYS = (0, 1, 4)  # Last holding day of Intraday, BTST and Velocity; longer holds are Swing
 
 # Chart and visualization constants
 CHART_MARKER_SIZE_MIN = 8  # Minimum marker size in pixels
@@ -38,6 +44,12 @@ CHART_PROFIT_FACTOR_CAP = 5.0  # Maximum profit factor value to display (actual
 THREAD_POOL_MAX_WORKERS = 10  # Maximum concurrent workers for parallel processing
 API_TIMEOUT_SECONDS = 10  # Timeout for API requests in seconds
 
+# OHLCV columns of fetched price history, keyed by lower-cased name; openchart's
+# columns are renamed to these on fetch whatever their casing
+HISTORICAL_COLUMN_NAMES = {
+    'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'
+}
+
 # Cache settings
 CACHE_TTL_SECONDS = 1800  # Cache time-to-live in seconds (30 minutes)
 
@@ -148,7 +148,7 @@ def show(
     st.markdown("---")
     st.header("⏱️ Trading Style Performance")
     st.markdown('<div id="trading-style-performance"></div>', unsafe_allow_html=True)
-    sentiment_data = mc.calculate_holding_sentiment(filtered_tradebook)
+    sentiment_data = mc.calculate_holding_sentiment(filtered_tradebook, include_recommendation=False)
     
     render_trading_style_metrics(sentiment_data)
     
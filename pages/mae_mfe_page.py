@@ -78,7 +78,7 @@ def fetch_historical_data_cached(symbol, start_date, end_date, interval, segment
         
         if not hist_data.empty:
             # Normalize column names
-            hist_data.columns = [col.title() for col in hist_data.columns]
+            mc.normalize_history_columns(hist_data)
             return hist_data
         else:
             return pd.DataFrame()
@@ -3,10 +3,121 @@ Excel Reader Service - Parses tradebook and P&L Excel files
 """
 
 import pandas as pd
+import numpy as np
+from importlib.util import find_spec
 from io import BytesIO
 from typing import Tuple, Optional, Dict
 import config
 
+# Prefer the Rust-based calamine engine when installed and pandas supports it
+# (2.2+); otherwise fall back to streaming the sheet with openpyxl in
+# read-only mode. Only check that it is installed: pandas imports it on the
+# first read.
+PANDAS_VERSION = tuple(int(part) for part in pd.__version__.split('.')[:2])
+HAS_CALAMINE = PANDAS_VERSION >= (2, 2) and find_spec('python_calamine') is not None
+
+
+def _read_xlsx_streaming(file: BytesIO, header_row: int) -> pd.DataFrame:
+    """
+    Read the first sheet with openpyxl in read-only, values-only mode.
+    
+    Mirrors pd.read_excel(file, header=header_row) for the simple tables in
+    Zerodha exports while skipping pandas' per-cell conversion: trailing
+    empty rows/columns are dropped and empty header cells become
+    'Unnamed: <n>'.
+    
+    Args:
+        file: File object (BytesIO) with .xlsx content
+        header_row: 0-indexed row holding the column headers
+        
+    Returns:
+        DataFrame: Sheet data below the header row
+    """
+    import openpyxl
+    
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        for _ in range(header_row):
+            next(rows, None)
+        header = next(rows, None)
+        data = list(rows)
+    finally:
+        wb.close()
+    
+    if header is None:
+        return pd.DataFrame()
+    
+    # Drop trailing empty rows, then trailing empty columns (as pandas does)
+    while data and all(value is None for value in data[-1]):
+        data.pop()
+    width = max([len(header)] + [len(row) for row in data])
+    while width > 0 and all(
+        len(row) < width or row[width - 1] is None for row in [header] + data
+    ):
+        width -= 1
+    
+    columns = []
+    seen = {}
+    for idx in range(width):
+        name = header[idx] if idx < len(header) else None
+        name = f"Unnamed: {idx}" if name is None else name
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    
+    # Empty cells become NaN (not None) so column dtypes match pd.read_excel
+    data = [
+        tuple(np.nan if value is None else value for value in row[:width]) + (np.nan,) * (width - len(row))
+        for row in data
+    ]
+    return pd.DataFrame(data, columns=columns)
+
+
+def _read_excel_table(file: BytesIO, header_row: int) -> pd.DataFrame:
+    """
+    Read a sheet whose column headers are at header_row, using calamine if
+    available and the streaming openpyxl reader otherwise.
+    """
+    if HAS_CALAMINE:
+        return pd.read_excel(file, header=header_row, engine='calamine')
+    return _read_xlsx_streaming(file, header_row)
+
+
+def parse_datetime_column(values: pd.Series, fmt: str) -> pd.Series:
+    """
+    Parse a column to datetime using an explicit format.
+    
+    The explicit format avoids pandas' per-value format inference. If any
+    non-empty value does not match the format, the whole column is re-parsed
+    with inference so non-standard exports still load.
+    
+    Args:
+        values: Series of date strings/objects
+        fmt: strftime format expected for the column
+        
+    Returns:
+        Series: Parsed datetimes (NaT where parsing failed)
+    """
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce', cache=True)
+    if (parsed.isna() & values.notna()).any():
+        parsed = pd.to_datetime(values, errors='coerce', cache=True)
+    return parsed
+
+
+def _downcast_integer_column(values: pd.Series) -> pd.Series:
+    """
+    Store a numeric column as int32 when every value is a whole number that
+    fits, halving its size for downstream aggregations. Otherwise unchanged.
+    """
+    if len(values) > 0 and values.notna().all() and (values % 1 == 0).all() \
+            and values.abs().max() < 2**31:
+        return values.astype(np.int32)
+    return values
+
 
 def read_tradebook(file: BytesIO) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     """
@@ -22,7 +133,7 @@ def read_tradebook(file: BytesIO) -> Tuple[Optional[pd.DataFrame], Optional[str]
     """
     try:
         # Read Excel file
-        df = pd.read_excel(file, header=config.TRADEBOOK_HEADER_ROW)
+        df = _read_excel_table(file, config.TRADEBOOK_HEADER_ROW)
         
         # Drop empty first column if it exists
         if 'Unnamed: 0' in df.columns:
@@ -34,7 +145,7 @@ def read_tradebook(file: BytesIO) -> Tuple[Optional[pd.DataFrame], Optional[str]
             return None, f"Missing required columns in tradebook: {', '.join(missing_cols)}"
         
         # Parse Trade Date to datetime
-        df['Trade Date'] = pd.to_datetime(df['Trade Date'], errors='coerce')
+        df['Trade Date'] = parse_datetime_column(df['Trade Date'], config.TRADEBOOK_DATE_FORMAT)
         
         # Check for invalid dates
         if df['Trade Date'].isna().any():
@@ -47,9 +158,21 @@ def read_tradebook(file: BytesIO) -> Tuple[Optional[pd.DataFrame], Optional[str]
         if df['Quantity'].isna().any() or df['Price'].isna().any():
             return None, "Invalid numeric values found in Quantity or Price columns"
         
+        # Share counts are whole numbers; prices stay float64 for exact P&L sums
+        df['Quantity'] = _downcast_integer_column(df['Quantity'])
+        
+        # Parse execution time once at load so metrics don't re-parse it per call
+        df['Order Execution Time'] = parse_datetime_column(
+            df['Order Execution Time'], config.ORDER_EXECUTION_TIME_FORMAT
+        )
+        
         # Remove rows with any remaining NaN values in critical columns
         df = df.dropna(subset=['Symbol', 'Trade Date', 'Trade Type'])
         
+        # Few distinct values: categoricals make equality masks code comparisons
+        df['Symbol'] = df['Symbol'].astype('category')
+        df['Trade Type'] = df['Trade Type'].astype('category')
+        
         # Reset index
         df = df.reset_index(drop=True)
         
@@ -74,7 +197,7 @@ def read_pnl(file: BytesIO) -> Tuple[Optional[pd.DataFrame], Optional[str], floa
     """
     try:
         # Read Excel file
-        df = pd.read_excel(file, header=config.PNL_HEADER_ROW)
+        df = _read_excel_table(file, config.PNL_HEADER_ROW)
         
         # Drop empty first column if it exists
         if 'Unnamed: 0' in df.columns:
@@ -94,6 +217,9 @@ def read_pnl(file: BytesIO) -> Tuple[Optional[pd.DataFrame], Optional[str], floa
         # Remove rows with NaN in critical columns
         df = df.dropna(subset=['Symbol', 'Realized P&L'])
         
+        # Share counts are whole numbers; money columns stay float64
+        df['Quantity'] = _downcast_integer_column(df['Quantity'])
+        
         # Reset index
         df = df.reset_index(drop=True)
         
@@ -126,7 +252,10 @@ def extract_charges(file: BytesIO) -> Tuple[float, Dict[str, float]]:
         
         # Read the charges section (around row 14-32)
         # We'll read rows 14-35 to capture the charges section
-        charges_df = pd.read_excel(file, header=None, skiprows=13, nrows=25)
+        charges_df = pd.read_excel(
+            file, header=None, skiprows=13, nrows=25,
+            engine='calamine' if HAS_CALAMINE else None
+        )
         
         total_brokerage_taxes = 0.0
         dp_charges_dict = {}
@@ -4,12 +4,19 @@ Metrics Calculator Service - Calculates swing trading metrics
 
 import pandas as pd
 import numpy as np
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from operator import itemgetter
 from datetime import datetime, timedelta
 from typing import Optional, List, Tuple, Dict, Callable, Any, Union
 import config
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.logger import logger
+from services.excel_reader import parse_datetime_column
 
 # Import config constants
 ROLLING_WINDOW_SIZE = config.ROLLING_WINDOW_SIZE
@@ -19,6 +26,66 @@ PROGRESS_MATCHING = config.PROGRESS_MATCHING
 PROGRESS_PREPARE = config.PROGRESS_PREPARE
 PROGRESS_FETCH_START = config.PROGRESS_FETCH_START
 PROGRESS_FETCH_RANGE = config.PROGRESS_FETCH_RANGE
+HISTORICAL_COLUMN_NAMES = config.HISTORICAL_COLUMN_NAMES
+HISTORY_REQUIRED_COLUMNS = frozenset(['Low', 'High'])
+HOLDING_STYLE_MAX_DAYS = np.asarray(config.HOLDING_STYLE_MAX_DAYS, dtype=np.int64)
+
+NANOSECONDS_PER_DAY = 86_400 * 10**9
+
+# Profitability ranking markers by rank (1st, 2nd, 3rd, then the rest)
+RANKING_EMOJI = ('', '🥇', '🥈', '🥉', '📍')
+
+# Trade side codes used by the FIFO matcher
+SIDE_BUY = 1
+SIDE_SELL = -1
+
+# Outcome codes of a matched trade's P&L (bincount bins)
+OUTCOME_FLAT = 0
+OUTCOME_WIN = 1
+OUTCOME_LOSS = 2
+
+# Columns that determine the FIFO matching result
+FIFO_COLUMNS = ['Symbol', 'Trade Date', 'Trade Type', 'Quantity', 'Price', 'Trade ID', 'Order Execution Time']
+# Columns of the FIFO match table (one row per matched sell/buy lot pair)
+MATCH_COLUMNS = [
+    'Symbol', 'Sell ID', 'Buy Date', 'Sell Date', 'Holding Days',
+    'Quantity', 'Buy Price', 'Sell Price', 'PnL'
+]
+FIFO_CACHE_SIZE = 4
+
+# FIFO matches keyed by tradebook content (most recently used last). Shared
+# by all Streamlit session threads, so every access holds the lock.
+_fifo_match_cache: 'OrderedDict[Tuple, pd.DataFrame]' = OrderedDict()
+_fifo_match_lock = threading.Lock()
+
+
+def _pnl_summary(pnl_data: pd.DataFrame) -> Tuple[float, float]:
+    """
+    Compute win rate and profit factor from one pass over the realized P&L.
+    
+    Args:
+        pnl_data: DataFrame with P&L data
+        
+    Returns:
+        tuple: (win_rate, profit_factor)
+    """
+    pnl = pnl_data['Realized P&L'].to_numpy(dtype=float)
+    is_profit = pnl > 0
+    is_loss = pnl < 0
+    
+    # Missing P&L counts towards the total (it is != 0), as before
+    total = np.count_nonzero(pnl != 0)
+    win_rate = (np.count_nonzero(is_profit) / total) * 100 if total > 0 else 0.0
+    
+    gross_profit = pnl[is_profit].sum()
+    gross_loss = abs(pnl[is_loss].sum())
+    
+    if gross_loss == 0:
+        profit_factor = float('inf') if gross_profit > 0 else 0.0
+    else:
+        profit_factor = gross_profit / gross_loss
+    
+    return win_rate, profit_factor
 
 
 def calculate_win_rate(pnl_data: pd.DataFrame) -> float:
@@ -34,13 +101,7 @@ def calculate_win_rate(pnl_data: pd.DataFrame) -> float:
     if pnl_data is None or len(pnl_data) == 0:
         return 0.0
     
-    profitable = len(pnl_data[pnl_data['Realized P&L'] > 0])
-    total = len(pnl_data[pnl_data['Realized P&L'] != 0])
-    
-    if total == 0:
-        return 0.0
-    
-    return (profitable / total) * 100
+    return _pnl_summary(pnl_data)[0]
 
 
 def calculate_profit_factor(pnl_data: pd.DataFrame) -> float:
@@ -56,13 +117,250 @@ def calculate_profit_factor(pnl_data: pd.DataFrame) -> float:
     if pnl_data is None or len(pnl_data) == 0:
         return 0.0
     
-    gross_profit = pnl_data[pnl_data['Realized P&L'] > 0]['Realized P&L'].sum()
-    gross_loss = abs(pnl_data[pnl_data['Realized P&L'] < 0]['Realized P&L'].sum())
+    return _pnl_summary(pnl_data)[1]
+
+
+def _with_exec_time(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return trades with a parsed 'ExecTime' column for FIFO sorting.
+    Reuses 'Order Execution Time' as-is when read_tradebook already parsed it.
+    """
+    exec_time = trades['Order Execution Time']
+    if not pd.api.types.is_datetime64_any_dtype(exec_time):
+        exec_time = parse_datetime_column(exec_time, config.ORDER_EXECUTION_TIME_FORMAT)
+    return trades.assign(ExecTime=exec_time)
+
+
+def normalize_history_columns(hist_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rename fetched OHLCV columns in place to 'Open', 'High', 'Low', 'Close'
+    and 'Volume', whatever casing openchart returns them in. Other columns
+    are left as they are.
     
-    if gross_loss == 0:
-        return float('inf') if gross_profit > 0 else 0.0
+    Args:
+        hist_data: Price history DataFrame from openchart
+        
+    Returns:
+        DataFrame: The same DataFrame, with renamed columns
+    """
+    hist_data.rename(
+        columns=lambda col: HISTORICAL_COLUMN_NAMES.get(str(col).lower(), col),
+        inplace=True
+    )
+    return hist_data
+
+
+def _sort_for_fifo(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort trades into FIFO order with one whole-frame sort per match: Symbol,
+    Trade Date, execution time, then Trade ID (as string for consistent
+    ordering). Per-symbol slices of the result are already in matching order.
+    """
+    if 'Order Execution Time' in trades.columns:
+        trades = _with_exec_time(trades)
+    
+    sort_cols = ['Symbol', 'Trade Date']
+    if 'ExecTime' in trades.columns:
+        sort_cols.append('ExecTime')
+    if 'Trade ID' in trades.columns:
+        trades = trades.assign(**{'Trade ID': trades['Trade ID'].astype(str)})
+        sort_cols.append('Trade ID')
+    
+    return trades.sort_values(sort_cols, na_position='last')
+
+
+@dataclass
+class _TradeColumns:
+    """Tradebook columns in FIFO order, as contiguous NumPy arrays."""
+    symbols: np.ndarray     # Distinct symbols, indexed by symbol_ids
+    symbol_ids: np.ndarray  # int32 symbol code per trade
+    dates: np.ndarray       # int64 Trade Date in nanoseconds
+    qty: np.ndarray         # float64 quantity
+    price: np.ndarray       # float64 price
+    side: np.ndarray        # int8 SIDE_BUY / SIDE_SELL (0 for anything else)
+
+
+def _extract_cols(trades: pd.DataFrame) -> _TradeColumns:
+    """
+    Sort trades into FIFO order and pull out the columns the matcher needs.
+    Trades missing a symbol, date, quantity or price are skipped.
+    
+    Args:
+        trades: DataFrame with tradebook data
+        
+    Returns:
+        _TradeColumns: Column arrays, grouped by symbol in sorted order
+    """
+    trades = _sort_for_fifo(trades).dropna(subset=['Symbol', 'Trade Date', 'Quantity', 'Price'])
+    
+    # Rows are sorted by symbol, so codes increase block by block
+    symbol_ids, symbols = pd.factorize(trades['Symbol'])
+    
+    side = np.zeros(len(trades), dtype=np.int8)
+    side[(trades['Trade Type'] == 'buy').to_numpy()] = SIDE_BUY
+    side[(trades['Trade Type'] == 'sell').to_numpy()] = SIDE_SELL
+    
+    return _TradeColumns(
+        symbols=np.asarray(symbols, dtype=object),
+        symbol_ids=symbol_ids.astype(np.int32),
+        dates=trades['Trade Date'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+        qty=trades['Quantity'].to_numpy(dtype=np.float64),
+        price=trades['Price'].to_numpy(dtype=np.float64),
+        side=side
+    )
+
+
+def _fifo_match_symbol(
+    qty: np.ndarray,
+    side: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    FIFO-match one symbol's trades (already in FIFO order) with NumPy.
+    
+    Buy and sell quantities are laid out on cumulative-quantity axes; every
+    overlap between a sell's range and a buy lot's range is one match. A sell
+    larger than the open position only closes what is open, and a sell with
+    nothing open is ignored (it never offsets later buys).
+    
+    Args:
+        qty: Trade quantities
+        side: Trade side codes (SIDE_BUY / SIDE_SELL)
+        
+    Returns:
+        tuple: (buy_idx, sell_idx, matched_qty) - one entry per (sell, buy lot)
+        pair, in the order the pairs are closed
+    """
+    is_buy = side == SIDE_BUY
+    is_sell = side == SIDE_SELL
+    signed_qty = np.where(is_buy, qty, np.where(is_sell, -qty, 0.0))
+    position = np.cumsum(signed_qty)
+    # Open position clamped at zero (excess sells don't go short)
+    open_qty = position - np.minimum(np.minimum.accumulate(position), 0.0)
+    open_before = np.concatenate(([0.0], open_qty[:-1]))
+    closed_qty = np.where(is_sell, open_before - open_qty, 0.0)
+    
+    buy_idx = np.flatnonzero(is_buy & (qty > 0))
+    sell_idx = np.flatnonzero(closed_qty > 0)
+    if len(buy_idx) == 0 or len(sell_idx) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=float)
+    
+    buy_edges = np.cumsum(qty[buy_idx])
+    sell_edges = np.cumsum(closed_qty[sell_idx])
+    breaks = np.unique(np.concatenate((
+        [0.0], buy_edges[buy_edges < sell_edges[-1]], sell_edges
+    )))
+    starts = breaks[:-1]
+    lots = np.searchsorted(buy_edges, starts, side='right')
+    sells = np.searchsorted(sell_edges, starts, side='right')
+    
+    return buy_idx[lots], sell_idx[sells], np.diff(breaks)
+
+
+def _compute_fifo_match(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    FIFO-match buy and sell trades for every symbol.
+    
+    Args:
+        trades: DataFrame with tradebook data
+        
+    Returns:
+        DataFrame: One row per matched (sell, buy lot) pair, ordered by symbol
+        and then by closing order, with MATCH_COLUMNS. 'Sell ID' is shared
+        by all matches of the same sell trade.
+    """
+    cols = _extract_cols(trades)
+    
+    if len(cols.symbol_ids) == 0:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    
+    # Each symbol is one contiguous block of rows
+    block_starts = np.flatnonzero(np.diff(cols.symbol_ids)) + 1
+    block_bounds = zip(
+        np.concatenate(([0], block_starts)),
+        np.concatenate((block_starts, [len(cols.symbol_ids)]))
+    )
+    
+    buy_rows = []
+    sell_rows = []
+    matched_qty = []
+    
+    for start, end in block_bounds:
+        buy_idx, sell_idx, qty_matched = _fifo_match_symbol(cols.qty[start:end], cols.side[start:end])
+        buy_rows.append(buy_idx + start)
+        sell_rows.append(sell_idx + start)
+        matched_qty.append(qty_matched)
+    
+    buy_rows = np.concatenate(buy_rows)
+    sell_rows = np.concatenate(sell_rows)
+    matched_qty = np.concatenate(matched_qty)
+    sell_dates = cols.dates[sell_rows]
+    
+    return pd.DataFrame({
+        'Symbol': cols.symbols[cols.symbol_ids[sell_rows]],
+        'Sell ID': sell_rows,
+        'Buy Date': cols.dates[buy_rows].astype('datetime64[ns]'),
+        # P&L is realized on the sell's calendar day
+        'Sell Date': (sell_dates - sell_dates % NANOSECONDS_PER_DAY).astype('datetime64[ns]'),
+        # Floor division matches Timedelta.days
+        'Holding Days': (sell_dates - cols.dates[buy_rows]) // NANOSECONDS_PER_DAY,
+        'Quantity': matched_qty,
+        'Buy Price': cols.price[buy_rows],
+        'Sell Price': cols.price[sell_rows],
+        'PnL': (cols.price[sell_rows] - cols.price[buy_rows]) * matched_qty
+    })
+
+
+def _fifo_match(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    FIFO-match buy and sell trades, reusing the result for a tradebook that
+    was already matched (several metrics on one page share the same trades).
+    
+    Args:
+        trades: DataFrame with tradebook data
+        
+    Returns:
+        DataFrame: Matches as returned by _compute_fifo_match (do not modify)
+    """
+    columns = [col for col in FIFO_COLUMNS if col in trades.columns]
+    row_hashes = pd.util.hash_pandas_object(trades[columns], index=False).to_numpy()
+    key = (tuple(columns), len(trades), hashlib.sha1(row_hashes.tobytes()).hexdigest())
     
-    return gross_profit / gross_loss
+    with _fifo_match_lock:
+        matches = _fifo_match_cache.get(key)
+        if matches is not None:
+            _fifo_match_cache.move_to_end(key)
+            return matches
+    
+    # Match outside the lock so other sessions aren't blocked meanwhile
+    matches = _compute_fifo_match(trades)
+    
+    with _fifo_match_lock:
+        _fifo_match_cache[key] = matches
+        if len(_fifo_match_cache) > FIFO_CACHE_SIZE:
+            _fifo_match_cache.popitem(last=False)
+    
+    return matches
+
+
+def build_match_table(trades: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the FIFO matched-trade table that the holding period, P&L and
+    trading-style metrics are derived from.
+    
+    Args:
+        trades: DataFrame with tradebook data
+        
+    Returns:
+        DataFrame: One row per matched (sell, buy lot) pair with columns
+        ['Symbol', 'Sell ID', 'Buy Date', 'Sell Date', 'Holding Days',
+         'Quantity', 'Buy Price', 'Sell Price', 'PnL']
+    """
+    if trades is None or len(trades) == 0:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    
+    # Copy so callers can't modify the cached table
+    return _fifo_match(trades).copy()
 
 
 def match_buy_sell_trades(trades: pd.DataFrame) -> List[Tuple[int, float]]:
@@ -77,77 +375,12 @@ def match_buy_sell_trades(trades: pd.DataFrame) -> List[Tuple[int, float]]:
     Returns:
         list: List of tuples (holding_days, quantity) for each matched trade
     """
-    holding_periods = []  # List of (days, quantity) tuples
+    matches = _fifo_match(trades)
     
-    # Group trades by symbol - sort symbols for deterministic processing order
-    for symbol in sorted(trades['Symbol'].unique()):
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
-        
-        # Sort by Trade Date and Order Execution Time for proper FIFO matching
-        # Ensure Trade ID is converted to string for consistent sorting
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-        
-        if 'Order Execution Time' in symbol_trades.columns:
-            # Parse execution time if available
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            # Sort by date first, then by execution time if available, then by Trade ID
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
-            )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-        
-        buy_trades = []  # List of {date, quantity}
-        
-        for _, trade in symbol_trades.iterrows():
-            trade_date = trade['Trade Date']
-            
-            if pd.isna(trade_date):
-                continue
-                
-            if trade['Trade Type'] == 'buy':
-                # Add buy trade to queue (FIFO)
-                buy_trades.append({
-                    'date': trade_date,
-                    'quantity': trade['Quantity']
-                })
-            elif trade['Trade Type'] == 'sell' and len(buy_trades) > 0:
-                # Match sell with earliest buy (FIFO)
-                remaining_sell = trade['Quantity']
-                
-                while remaining_sell > 0 and len(buy_trades) > 0:
-                    buy = buy_trades[0]
-                    buy_date = buy['date']
-                    
-                    # Calculate holding period in days
-                    holding_days = (trade_date - buy_date).days
-                    
-                    # Ensure holding period is non-negative (sell should be after buy)
-                    if holding_days < 0:
-                        # This shouldn't happen if data is sorted correctly
-                        # Skip this buy and try next
-                        buy_trades.pop(0)
-                        continue
-                    
-                    if buy['quantity'] <= remaining_sell:
-                        # Use entire buy trade
-                        matched_qty = buy['quantity']
-                        holding_periods.append((holding_days, matched_qty))
-                        remaining_sell -= matched_qty
-                        buy_trades.pop(0)
-                    else:
-                        # Use partial buy trade
-                        matched_qty = remaining_sell
-                        holding_periods.append((holding_days, matched_qty))
-                        buy['quantity'] -= matched_qty
-                        remaining_sell = 0
-    
-    return holding_periods
+    return list(zip(
+        matches['Holding Days'].tolist(),
+        matches['Quantity'].tolist()
+    ))
 
 
 def calculate_avg_holding_period(trades: pd.DataFrame) -> float:
@@ -163,14 +396,16 @@ def calculate_avg_holding_period(trades: pd.DataFrame) -> float:
     if trades is None or len(trades) == 0:
         return 0.0
     
-    holding_periods = match_buy_sell_trades(trades)
+    matches = _fifo_match(trades)
     
-    if len(holding_periods) == 0:
+    if len(matches) == 0:
         return 0.0
     
     # Calculate weighted average: sum(days * quantity) / sum(quantity)
-    total_days = sum(days * qty for days, qty in holding_periods)
-    total_quantity = sum(qty for _, qty in holding_periods)
+    days = matches['Holding Days'].to_numpy(dtype=float)
+    quantity = matches['Quantity'].to_numpy(dtype=float)
+    total_days = np.dot(days, quantity)
+    total_quantity = quantity.sum()
     
     if total_quantity == 0:
         return 0.0
@@ -191,42 +426,25 @@ def get_daily_pnl(trades: pd.DataFrame) -> pd.DataFrame:
     if trades is None or len(trades) == 0:
         return pd.DataFrame(columns=['Date', 'PnL'])
     
-    # Group by date and calculate net P&L
-    daily_pnl = []
-    
-    for date in trades['Trade Date'].unique():
-        date_trades = trades[trades['Trade Date'] == date]
-        
-        # Calculate net P&L for the day (simplified: sell value - buy value)
-        buy_trades = date_trades[date_trades['Trade Type'] == 'buy']
-        sell_trades = date_trades[date_trades['Trade Type'] == 'sell']
-        
-        # Handle cases where there are no buys or sells
-        if len(buy_trades) > 0:
-            buy_qty = buy_trades['Quantity'].sum()
-            buy_price = buy_trades['Price'].mean()
-            if pd.isna(buy_price):
-                buy_price = 0
-            buy_value = buy_qty * buy_price
-        else:
-            buy_value = 0
-        
-        if len(sell_trades) > 0:
-            sell_qty = sell_trades['Quantity'].sum()
-            sell_price = sell_trades['Price'].mean()
-            if pd.isna(sell_price):
-                sell_price = 0
-            sell_value = sell_qty * sell_price
-        else:
-            sell_value = 0
-        
-        # This is approximate; actual P&L should come from P&L file
-        daily_pnl.append({
-            'Date': pd.to_datetime(date),
-            'PnL': sell_value - buy_value
-        })
-    
-    return pd.DataFrame(daily_pnl).sort_values('Date')
+    # Net P&L per day (simplified: sell value - buy value, each valued at
+    # the day's total quantity times its mean price)
+    by_side = trades.groupby(['Trade Date', 'Trade Type'], sort=True, observed=True).agg(
+        qty=('Quantity', 'sum'),
+        px=('Price', 'mean')
+    ).fillna(0).unstack('Trade Type', fill_value=0)
+    
+    # A side with no trades at all contributes nothing
+    sides = pd.MultiIndex.from_product([['qty', 'px'], ['buy', 'sell']])
+    by_side = by_side.reindex(columns=sides, fill_value=0)
+    
+    buy_value = by_side[('qty', 'buy')] * by_side[('px', 'buy')]
+    sell_value = by_side[('qty', 'sell')] * by_side[('px', 'sell')]
+    
+    # This is approximate; actual P&L should come from P&L file
+    return pd.DataFrame({
+        'Date': pd.to_datetime(by_side.index),
+        'PnL': (sell_value - buy_value).to_numpy(dtype=float)
+    })
 
 
 def get_daily_pnl_from_pnl_data(pnl_data: pd.DataFrame, trades: pd.DataFrame) -> pd.DataFrame:
@@ -244,80 +462,23 @@ def get_daily_pnl_from_pnl_data(pnl_data: pd.DataFrame, trades: pd.DataFrame) ->
     if trades is None or len(trades) == 0:
         return pd.DataFrame(columns=['Date', 'PnL'])
     
-    daily_pnl_dict = {}
+    matches = _fifo_match(trades)
     
-    # Group trades by symbol for FIFO matching - sort symbols for deterministic order
-    for symbol in sorted(trades['Symbol'].unique()):
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
-        
-        # Sort by Trade Date and Order Execution Time for proper FIFO matching
-        # Ensure Trade ID is converted to string for consistent sorting
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-        
-        if 'Order Execution Time' in symbol_trades.columns:
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
-            )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-        
-        # FIFO matching: track buy positions
-        buy_queue = []  # List of {date, quantity, price}
-        
-        for _, trade in symbol_trades.iterrows():
-            trade_date = pd.to_datetime(trade['Trade Date']).date()
-            quantity = trade['Quantity']
-            price = trade['Price']
-            
-            if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-                continue
-            
-            if trade['Trade Type'] == 'buy':
-                # Add to buy queue
-                buy_queue.append({
-                    'date': trade_date,
-                    'quantity': quantity,
-                    'price': price
-                })
-            
-            elif trade['Trade Type'] == 'sell' and len(buy_queue) > 0:
-                # Match sell with buys using FIFO
-                remaining_sell = quantity
-                
-                while remaining_sell > 0 and len(buy_queue) > 0:
-                    buy = buy_queue[0]
-                    
-                    # Calculate P&L for this match
-                    matched_qty = min(buy['quantity'], remaining_sell)
-                    pnl = (price - buy['price']) * matched_qty
-                    
-                    # Attribute P&L to sell date (when P&L is realized)
-                    if trade_date in daily_pnl_dict:
-                        daily_pnl_dict[trade_date] += pnl
-                    else:
-                        daily_pnl_dict[trade_date] = pnl
-                    
-                    # Update quantities
-                    if buy['quantity'] <= remaining_sell:
-                        # Entire buy position consumed
-                        remaining_sell -= buy['quantity']
-                        buy_queue.pop(0)
-                    else:
-                        # Partial buy position consumed
-                        buy['quantity'] -= remaining_sell
-                        remaining_sell = 0
-    
-    # Convert to DataFrame
-    daily_pnl_list = [{'Date': pd.to_datetime(date), 'PnL': pnl} 
-                      for date, pnl in daily_pnl_dict.items()]
-    
-    return pd.DataFrame(daily_pnl_list).sort_values('Date')
+    if len(matches) == 0:
+        return pd.DataFrame(columns=['Date', 'PnL'])
+    
+    # Attribute P&L to sell date (when P&L is realized)
+    date_codes, sell_dates = pd.factorize(matches['Sell Date'], sort=True)
+    daily_pnl = np.bincount(
+        date_codes,
+        weights=matches['PnL'].to_numpy(dtype=float),
+        minlength=len(sell_dates)
+    )
+    
+    return pd.DataFrame({
+        'Date': sell_dates,
+        'PnL': daily_pnl
+    })
 
 
 def get_weekly_pnl(daily_pnl: pd.DataFrame) -> pd.DataFrame:
@@ -333,10 +494,10 @@ def get_weekly_pnl(daily_pnl: pd.DataFrame) -> pd.DataFrame:
     if daily_pnl is None or len(daily_pnl) == 0:
         return pd.DataFrame(columns=['Week', 'PnL'])
     
-    daily_pnl = daily_pnl.copy()
-    daily_pnl['Week'] = daily_pnl['Date'].dt.to_period('W').dt.start_time
-    
-    weekly_pnl = daily_pnl.groupby('Week')['PnL'].sum().reset_index()
+    # Monday-anchored weekly bins labelled by week start; min_count=1 + dropna
+    # keeps only weeks that actually had trades (same as the old groupby)
+    pnl_series = daily_pnl.set_index('Date')['PnL'].sort_index()
+    weekly_pnl = pnl_series.resample('W-MON', label='left', closed='left').sum(min_count=1).dropna().reset_index()
     weekly_pnl.columns = ['Week', 'PnL']
     
     return weekly_pnl
@@ -355,10 +516,8 @@ def get_monthly_pnl(daily_pnl: pd.DataFrame) -> pd.DataFrame:
     if daily_pnl is None or len(daily_pnl) == 0:
         return pd.DataFrame(columns=['Month', 'PnL'])
     
-    daily_pnl = daily_pnl.copy()
-    daily_pnl['Month'] = daily_pnl['Date'].dt.to_period('M').dt.start_time
-    
-    monthly_pnl = daily_pnl.groupby('Month')['PnL'].sum().reset_index()
+    pnl_series = daily_pnl.set_index('Date')['PnL'].sort_index()
+    monthly_pnl = pnl_series.resample('MS').sum(min_count=1).dropna().reset_index()
     monthly_pnl.columns = ['Month', 'PnL']
     
     return monthly_pnl
@@ -377,10 +536,10 @@ def get_cumulative_pnl(daily_pnl: pd.DataFrame) -> pd.DataFrame:
     if daily_pnl is None or len(daily_pnl) == 0:
         return pd.DataFrame(columns=['Date', 'Cumulative P&L'])
     
-    cumulative = daily_pnl.copy()
-    cumulative['Cumulative P&L'] = cumulative['PnL'].cumsum()
-    
-    return cumulative[['Date', 'Cumulative P&L']]
+    return pd.DataFrame({
+        'Date': daily_pnl['Date'].to_numpy(),
+        'Cumulative P&L': np.cumsum(daily_pnl['PnL'].to_numpy(dtype=float))
+    }, index=daily_pnl.index)
 
 
 def calculate_daily_turnover(trades: pd.DataFrame) -> pd.DataFrame:
@@ -396,28 +555,19 @@ def calculate_daily_turnover(trades: pd.DataFrame) -> pd.DataFrame:
     if trades is None or len(trades) == 0:
         return pd.DataFrame(columns=['Date', 'Turnover'])
     
-    daily_turnover_dict = {}
+    dates = pd.to_datetime(trades['Trade Date']).dt.normalize().to_numpy()
+    turnover = trades['Quantity'].to_numpy(dtype=float) * trades['Price'].to_numpy(dtype=float)
     
-    for _, trade in trades.iterrows():
-        trade_date = pd.to_datetime(trade['Trade Date']).date()
-        quantity = trade['Quantity']
-        price = trade['Price']
-        
-        if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-            continue
-        
-        turnover = quantity * price
-        
-        if trade_date in daily_turnover_dict:
-            daily_turnover_dict[trade_date] += turnover
-        else:
-            daily_turnover_dict[trade_date] = turnover
+    # Skip trades with a missing date, quantity or price
+    valid = ~(np.isnat(dates) | np.isnan(turnover))
     
-    # Convert to DataFrame
-    daily_turnover_list = [{'Date': pd.to_datetime(date), 'Turnover': turnover} 
-                          for date, turnover in daily_turnover_dict.items()]
+    date_codes, trade_days = pd.factorize(dates[valid], sort=True)
+    daily_turnover = np.bincount(date_codes, weights=turnover[valid], minlength=len(trade_days))
     
-    return pd.DataFrame(daily_turnover_list).sort_values('Date')
+    return pd.DataFrame({
+        'Date': trade_days,
+        'Turnover': daily_turnover
+    })
 
 
 def distribute_charges_pro_rata(daily_pnl: pd.DataFrame, trades: pd.DataFrame, total_charges: float, dp_charges_dict: Optional[Dict[Union[str, datetime], float]] = None) -> pd.DataFrame:
@@ -438,42 +588,35 @@ def distribute_charges_pro_rata(daily_pnl: pd.DataFrame, trades: pd.DataFrame, t
     if daily_pnl is None or len(daily_pnl) == 0:
         return daily_pnl
     
-    daily_pnl = daily_pnl.copy()
-    
-    # Calculate daily turnover
-    daily_turnover = calculate_daily_turnover(trades)
-    
-    # Merge turnover with daily P&L
-    daily_pnl = daily_pnl.merge(daily_turnover, on='Date', how='left')
-    daily_pnl['Turnover'] = daily_pnl['Turnover'].fillna(0)
+    # Look up each day's turnover (0 for days without trades)
+    daily_turnover = calculate_daily_turnover(trades).set_index('Date')['Turnover']
+    turnover = daily_turnover.reindex(daily_pnl['Date'], fill_value=0).to_numpy(dtype=float)
     
     # Allocate brokerage + taxes pro-rata by turnover
     if total_charges > 0:
-        total_turnover = daily_pnl['Turnover'].sum()
+        total_turnover = turnover.sum()
         
         if total_turnover > 0:
             # Calculate charge per rupee of turnover
             charge_rate = total_charges / total_turnover
-            daily_pnl['Charges'] = daily_pnl['Turnover'] * charge_rate
+            charges = turnover * charge_rate
         else:
             # If no turnover, distribute evenly (fallback)
-            daily_pnl['Charges'] = total_charges / len(daily_pnl)
+            charges = np.full(len(turnover), total_charges / len(turnover))
     else:
-        daily_pnl['Charges'] = 0.0
+        charges = np.zeros(len(turnover))
     
     # Add DP charges on actual dates if provided
     if dp_charges_dict:
-        for date, dp_charge in dp_charges_dict.items():
-            date_obj = pd.to_datetime(date).date() if isinstance(date, str) else date
-            mask = daily_pnl['Date'].dt.date == date_obj
-            if mask.any():
-                daily_pnl.loc[mask, 'Charges'] += dp_charge
-    
-    # Subtract total charges from P&L
-    daily_pnl['PnL'] = daily_pnl['PnL'] - daily_pnl['Charges']
-    
-    # Drop turnover and charges columns (keep only Date and PnL)
-    return daily_pnl[['Date', 'PnL']]
+        dp_days = pd.to_datetime(list(dp_charges_dict.keys())).normalize()
+        dp_by_day = pd.Series(list(dp_charges_dict.values()), index=dp_days, dtype=float).groupby(level=0).sum()
+        charges += dp_by_day.reindex(daily_pnl['Date'].dt.normalize(), fill_value=0).to_numpy(dtype=float)
+    
+    # Subtract total charges from P&L (keep only Date and PnL)
+    return pd.DataFrame({
+        'Date': daily_pnl['Date'].to_numpy(),
+        'PnL': daily_pnl['PnL'].to_numpy(dtype=float) - charges
+    })
 
 
 def distribute_charges_evenly(daily_pnl: pd.DataFrame, total_charges: float) -> pd.DataFrame:
@@ -494,14 +637,10 @@ def distribute_charges_evenly(daily_pnl: pd.DataFrame, total_charges: float) ->
     if total_charges <= 0:
         return daily_pnl
     
-    daily_pnl = daily_pnl.copy()
-    num_trading_days = len(daily_pnl)
+    # Only the PnL column is replaced; other columns are shared, not copied
+    daily_charge = total_charges / len(daily_pnl)
     
-    if num_trading_days > 0:
-        daily_charge = total_charges / num_trading_days
-        daily_pnl['PnL'] = daily_pnl['PnL'] - daily_charge
-    
-    return daily_pnl
+    return daily_pnl.assign(PnL=daily_pnl['PnL'] - daily_charge)
 
 
 def get_equity_curve(daily_pnl: pd.DataFrame, initial_value: float = 0) -> pd.DataFrame:
@@ -518,10 +657,14 @@ def get_equity_curve(daily_pnl: pd.DataFrame, initial_value: float = 0) -> pd.Da
     if daily_pnl is None or len(daily_pnl) == 0:
         return pd.DataFrame(columns=['Date', 'Equity'])
     
-    equity = daily_pnl.copy()
-    equity['Equity'] = initial_value + equity['PnL'].cumsum()
+    # Offset the running total in place rather than allocating a second array
+    equity = np.cumsum(daily_pnl['PnL'].to_numpy(dtype=float))
+    equity += initial_value
     
-    return equity[['Date', 'Equity']]
+    return pd.DataFrame({
+        'Date': daily_pnl['Date'].to_numpy(),
+        'Equity': equity
+    }, index=daily_pnl.index)
 
 
 def calculate_sharpe_ratio(daily_pnl: pd.DataFrame, risk_free_rate: Optional[float] = None) -> float:
@@ -541,13 +684,17 @@ def calculate_sharpe_ratio(daily_pnl: pd.DataFrame, risk_free_rate: Optional[flo
     if risk_free_rate is None:
         risk_free_rate = config.RISK_FREE_RATE
     
-    returns = daily_pnl['PnL'].values
+    returns = daily_pnl['PnL'].to_numpy(dtype=float)
     
-    if len(returns) == 0:
+    # A single day has no volatility to measure
+    if len(returns) < 2:
         return 0.0
     
-    mean_return = np.mean(returns)
-    std_return = np.std(returns)
+    # Population std from the already-computed mean (no second mean pass,
+    # no squared temporary: dot product of the deviations)
+    mean_return = returns.mean()
+    deviations = returns - mean_return
+    std_return = np.sqrt(np.dot(deviations, deviations) / len(returns))
     
     if std_return == 0:
         return 0.0
@@ -577,16 +724,16 @@ def calculate_max_drawdown(cumulative_pnl: pd.DataFrame) -> float:
     if cumulative_pnl is None or len(cumulative_pnl) == 0:
         return 0.0
     
-    equity = cumulative_pnl['Cumulative P&L'].values
+    equity = cumulative_pnl['Cumulative P&L'].to_numpy(dtype=float)
     
     if len(equity) == 0:
         return 0.0
     
-    running_max = np.maximum.accumulate(equity)
-    drawdown = running_max - equity
-    max_drawdown = np.max(drawdown)
+    # Running peak, turned into drawdown in place (one temporary array)
+    drawdown = np.maximum.accumulate(equity)
+    np.subtract(drawdown, equity, out=drawdown)
     
-    return max_drawdown
+    return float(drawdown.max())
 
 
 def get_win_rate_by_symbol(pnl_data: pd.DataFrame, trades: Optional[pd.DataFrame] = None) -> pd.DataFrame:
@@ -605,86 +752,26 @@ def get_win_rate_by_symbol(pnl_data: pd.DataFrame, trades: Optional[pd.DataFrame
     
     # If trades data is provided, calculate win rate from individual trade matches
     if trades is not None and len(trades) > 0:
-        win_rate_list = []
-        
-        # Sort symbols for deterministic processing order
-        for symbol in sorted(trades['Symbol'].unique()):
-            symbol_trades = trades[trades['Symbol'] == symbol].copy()
-            
-            # Get trade matches with P&L for this symbol
-            # Sort by Trade Date and Order Execution Time for proper FIFO matching
-            # Ensure Trade ID is converted to string for consistent sorting
-            if 'Trade ID' in symbol_trades.columns:
-                symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-            
-            if 'Order Execution Time' in symbol_trades.columns:
-                symbol_trades['ExecTime'] = pd.to_datetime(
-                    symbol_trades['Order Execution Time'], 
-                    errors='coerce'
-                )
-                symbol_trades = symbol_trades.sort_values(
-                    ['Trade Date', 'ExecTime', 'Trade ID'],
-                    na_position='last'
-                )
-            else:
-                symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-            
-            buy_queue = []
-            winning_trades = 0
-            total_trades = 0
-            
-            for _, trade in symbol_trades.iterrows():
-                trade_date = trade['Trade Date']
-                quantity = trade['Quantity']
-                price = trade['Price']
-                
-                if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-                    continue
-                
-                if trade['Trade Type'] == 'buy':
-                    buy_queue.append({'quantity': quantity, 'price': price})
-                elif trade['Trade Type'] == 'sell' and len(buy_queue) > 0:
-                    remaining_sell = quantity
-                    sell_price = price
-                    
-                    # Accumulate total P&L for this sell transaction
-                    total_sell_pnl = 0.0
-                    
-                    while remaining_sell > 0 and len(buy_queue) > 0:
-                        buy = buy_queue[0]
-                        matched_qty = min(buy['quantity'], remaining_sell)
-                        pnl = (sell_price - buy['price']) * matched_qty
-                        
-                        # Accumulate P&L for this sell transaction
-                        total_sell_pnl += pnl
-                        
-                        if buy['quantity'] <= remaining_sell:
-                            remaining_sell -= buy['quantity']
-                            buy_queue.pop(0)
-                        else:
-                            buy['quantity'] -= matched_qty
-                            remaining_sell = 0
-                    
-                    # Count this entire sell transaction as ONE trade
-                    total_trades += 1
-                    if total_sell_pnl > 0:
-                        winning_trades += 1
+        matches = _fifo_match(trades)
+        
+        if len(matches) > 0:
+            # Count each sell transaction as ONE trade, using its total P&L
+            # (Sell IDs are unique across symbols, so one integer key suffices)
+            sells = matches.groupby('Sell ID', sort=False).agg(
+                Symbol=('Symbol', 'first'),
+                PnL=('PnL', 'sum')
+            )
+            win_rate = (sells['PnL'] > 0).groupby(sells['Symbol'], sort=True).mean().mul(100)
             
-            if total_trades > 0:
-                win_rate_pct = (winning_trades / total_trades) * 100
-                win_rate_list.append({
-                    'Symbol': symbol,
-                    'Win Rate %': win_rate_pct
-                })
-        
-        if len(win_rate_list) > 0:
-            return pd.DataFrame(win_rate_list).sort_values('Win Rate %', ascending=False)
+            return win_rate.reset_index(name='Win Rate %').sort_values('Win Rate %', ascending=False)
     
     # Fallback: Use P&L data (less accurate - just shows if overall symbol P&L is positive)
-    win_rate = pnl_data.copy()
-    win_rate['Win Rate %'] = win_rate['Realized P&L'].apply(lambda x: 100.0 if x > 0 else 0.0)
+    win_rate = pd.DataFrame({
+        'Symbol': pnl_data['Symbol'],
+        'Win Rate %': np.where(pnl_data['Realized P&L'] > 0, 100.0, 0.0)
+    })
     
-    return win_rate[['Symbol', 'Win Rate %']].sort_values('Win Rate %', ascending=False)
+    return win_rate.sort_values('Win Rate %', ascending=False)
 
 
 def get_avg_holding_period_by_stock(trades: pd.DataFrame) -> pd.DataFrame:
@@ -700,44 +787,21 @@ def get_avg_holding_period_by_stock(trades: pd.DataFrame) -> pd.DataFrame:
     if trades is None or len(trades) == 0:
         return pd.DataFrame(columns=['Symbol', 'Avg Holding Period (Days)'])
     
-    holding_periods_by_stock = []
-    
-    # Sort symbols for deterministic processing order
-    for symbol in sorted(trades['Symbol'].unique()):
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
-        
-        # Sort properly for FIFO matching
-        # Ensure Trade ID is converted to string for consistent sorting
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-        
-        if 'Order Execution Time' in symbol_trades.columns:
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
-            )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-        
-        periods = match_buy_sell_trades(symbol_trades)
-        
-        if len(periods) > 0:
-            # Calculate weighted average
-            total_days = sum(days * qty for days, qty in periods)
-            total_quantity = sum(qty for _, qty in periods)
-            
-            if total_quantity > 0:
-                avg_period = total_days / total_quantity
-                holding_periods_by_stock.append({
-                    'Symbol': symbol,
-                    'Avg Holding Period (Days)': avg_period
-                })
-    
-    return pd.DataFrame(holding_periods_by_stock).sort_values('Avg Holding Period (Days)', ascending=False)
+    matches = _fifo_match(trades)
+    
+    # Weighted average per symbol: sum(days * quantity) / sum(quantity)
+    quantity = matches['Quantity'].to_numpy(dtype=float)
+    totals = pd.DataFrame({
+        'weighted_days': matches['Holding Days'].to_numpy(dtype=float) * quantity,
+        'quantity': quantity
+    }).groupby(matches['Symbol'].to_numpy(), sort=True).sum()
+    totals = totals[totals['quantity'] > 0]
+    
+    holding_periods_by_stock = pd.DataFrame({
+        'Symbol': totals.index,
+        'Avg Holding Period (Days)': (totals['weighted_days'] / totals['quantity']).to_numpy(dtype=float)
+    })
+    return holding_periods_by_stock.sort_values('Avg Holding Period (Days)', ascending=False)
 
 
 def get_trade_duration_distribution(trades: pd.DataFrame) -> List[int]:
@@ -754,12 +818,9 @@ def get_trade_duration_distribution(trades: pd.DataFrame) -> List[int]:
     if trades is None or len(trades) == 0:
         return []
     
-    periods = match_buy_sell_trades(trades)
     # Return one entry per trade match (not weighted by quantity)
     # This gives the distribution of trade durations, not quantity-weighted
-    distribution = [days for days, _ in periods]
-    
-    return distribution
+    return _fifo_match(trades)['Holding Days'].tolist()
 
 
 def match_trades_with_pnl(trades: pd.DataFrame) -> List[Tuple[int, float, float]]:
@@ -774,89 +835,78 @@ def match_trades_with_pnl(trades: pd.DataFrame) -> List[Tuple[int, float, float]
     Returns:
         list: List of tuples (holding_days, pnl, quantity) for each matched trade
     """
-    trade_matches = []  # List of (days, pnl, quantity) tuples
+    matches = _fifo_match(trades)
     
-    # Group trades by symbol - sort symbols for deterministic processing order
-    for symbol in sorted(trades['Symbol'].unique()):
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
+    return list(zip(
+        matches['Holding Days'].tolist(),
+        matches['PnL'].tolist(),
+        matches['Quantity'].tolist()
+    ))
+
+
+def _style_recommendation(styles_sorted: List[Tuple[float, str, Dict[str, Any]]]) -> str:
+    """
+    Build the trading-style recommendation text.
+    
+    Args:
+        styles_sorted: (avg P&L, style name, metrics) tuples ranked best first
         
-        # Sort by Trade Date and Order Execution Time for proper FIFO matching
-        # Ensure Trade ID is converted to string for consistent sorting (handles numeric vs string IDs)
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
+    Returns:
+        str: Markdown recommendation text
+    """
+    recommendations = []
+    
+    if len(styles_sorted) >= 2:
+        _, best_style, best_metrics = styles_sorted[0]
+        _, worst_style, worst_metrics = styles_sorted[-1]
         
-        if 'Order Execution Time' in symbol_trades.columns:
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
+        # Generate recommendations
+        recommendations.append("📊 **Trading Style Performance Analysis:**\n")
+        
+        # Best performing style
+        if best_metrics['avg_pnl'] > 0:
+            recommendations.append(
+                f"✅ **{best_style}** is your most profitable style:\n"
+                f"   • Trades: {best_metrics['count']}\n"
+                f"   • Win Rate: {best_metrics['win_rate']:.1f}%\n"
+                f"   • Avg P&L: ₹{best_metrics['avg_pnl']:.2f}\n"
+                f"   💡 **Focus more on {best_style} trades**\n"
             )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
         
-        buy_queue = []  # List of {date, quantity, price}
+        # Worst performing style
+        if worst_metrics['avg_pnl'] < 0:
+            recommendations.append(
+                f"⚠️ **{worst_style}** is losing money:\n"
+                f"   • Trades: {worst_metrics['count']}\n"
+                f"   • Win Rate: {worst_metrics['win_rate']:.1f}%\n"
+                f"   • Avg P&L: ₹{worst_metrics['avg_pnl']:.2f}\n"
+                f"   💡 **Reduce or avoid {worst_style} trades**\n"
+            )
         
-        for _, trade in symbol_trades.iterrows():
-            trade_date = trade['Trade Date']
-            quantity = trade['Quantity']
-            price = trade['Price']
-            
-            if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-                continue
-                
-            if trade['Trade Type'] == 'buy':
-                # Add buy trade to queue (FIFO)
-                buy_queue.append({
-                    'date': trade_date,
-                    'quantity': quantity,
-                    'price': price
-                })
-            elif trade['Trade Type'] == 'sell' and len(buy_queue) > 0:
-                # Match sell with earliest buy (FIFO)
-                remaining_sell = quantity
-                sell_price = price
-                
-                while remaining_sell > 0 and len(buy_queue) > 0:
-                    buy = buy_queue[0]
-                    buy_date = buy['date']
-                    buy_price = buy['price']
-                    
-                    # Calculate holding period in days
-                    holding_days = (trade_date - buy_date).days
-                    
-                    # Ensure holding period is non-negative
-                    if holding_days < 0:
-                        buy_queue.pop(0)
-                        continue
-                    
-                    if buy['quantity'] <= remaining_sell:
-                        # Use entire buy trade
-                        matched_qty = buy['quantity']
-                        pnl = (sell_price - buy_price) * matched_qty
-                        trade_matches.append((holding_days, pnl, matched_qty))
-                        remaining_sell -= matched_qty
-                        buy_queue.pop(0)
-                    else:
-                        # Use partial buy trade
-                        matched_qty = remaining_sell
-                        pnl = (sell_price - buy_price) * matched_qty
-                        trade_matches.append((holding_days, pnl, matched_qty))
-                        buy['quantity'] -= matched_qty
-                        remaining_sell = 0
-    
-    return trade_matches
-
-
-def calculate_holding_sentiment(trades: pd.DataFrame) -> Dict[str, Any]:
+        # Compare all styles
+        recommendations.append("📈 **Profitability Ranking:**")
+        for rank, (avg_pnl, style, metrics) in enumerate(styles_sorted, 1):
+            emoji = RANKING_EMOJI[min(rank, len(RANKING_EMOJI) - 1)]
+            win_rate, count = metrics['win_rate'], metrics['count']
+            recommendations.append(
+                f"{emoji} {style}: ₹{avg_pnl:.2f} avg | "
+                f"{win_rate:.1f}% win rate | {count} trades"
+            )
+    else:
+        recommendations.append("Need more trades across different holding periods for comprehensive analysis")
+    
+    return '\n'.join(recommendations)
+
+
+def calculate_holding_sentiment(trades: pd.DataFrame, include_recommendation: bool = True) -> Dict[str, Any]:
     """
     Analyze holding period vs profitability by trading style to generate insights.
     Categories: Intraday (0 days), BTST (1 day), Velocity (2-4 days), Swing (>4 days)
     
     Args:
         trades: DataFrame with tradebook data
+        include_recommendation: Build the recommendation text (callers that only
+            show the per-style metrics can skip it; 'recommendation' is then None)
         
     Returns:
         dict: Sentiment analysis with recommendations by trading style
@@ -875,9 +925,9 @@ def calculate_holding_sentiment(trades: pd.DataFrame) -> Dict[str, Any]:
         }
     
     # Get matched trades with P&L
-    trade_matches = match_trades_with_pnl(trades)
+    matches = _fifo_match(trades)
     
-    if len(trade_matches) == 0:
+    if len(matches) == 0:
         return {
             'sentiment': 'neutral',
             'intraday': {'count': 0, 'win_rate': 0.0, 'avg_pnl': 0.0},
@@ -890,96 +940,64 @@ def calculate_holding_sentiment(trades: pd.DataFrame) -> Dict[str, Any]:
             'worst_style': None
         }
     
-    # Categorize trades by trading style
-    intraday_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days == 0]
-    btst_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days == 1]
-    velocity_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if 2 <= days <= 4]
-    swing_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days > 4]
-    pure_swing_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days > 0]  # All trades > 0 day
+    # Categorize trades by trading style in one pass: 0 = Intraday (0 days),
+    # 1 = BTST (1 day), 2 = Velocity (2-4 days), 3 = Swing (>4 days)
+    days = matches['Holding Days'].to_numpy(dtype=np.int64)
+    pnl = matches['PnL'].to_numpy(dtype=float)
+    style_idx = np.searchsorted(HOLDING_STYLE_MAX_DAYS, days, side='left')
+    
+    # Per-style accumulators: trade count, winning trades, total P&L
+    counts = np.bincount(style_idx, minlength=4)
+    wins = np.bincount(style_idx, weights=pnl > 0, minlength=4)
+    total_pnl = np.bincount(style_idx, weights=pnl, minlength=4)
     
     # Helper function to calculate metrics
-    def calc_metrics(trade_list):
-        if len(trade_list) == 0:
+    def calc_metrics(count, win_count, pnl_sum):
+        count = int(count)
+        if count == 0:
             return {'count': 0, 'win_rate': 0.0, 'avg_pnl': 0.0}
         
-        wins = sum(1 for _, pnl, _ in trade_list if pnl > 0)
-        win_rate = (wins / len(trade_list)) * 100
-        avg_pnl = sum(pnl for _, pnl, _ in trade_list) / len(trade_list)
-        
         return {
-            'count': len(trade_list),
-            'win_rate': win_rate,
-            'avg_pnl': avg_pnl
+            'count': count,
+            'win_rate': (float(win_count) / count) * 100,
+            'avg_pnl': float(pnl_sum) / count
         }
     
     # Calculate metrics for each style
-    intraday_metrics = calc_metrics(intraday_trades)
-    btst_metrics = calc_metrics(btst_trades)
-    velocity_metrics = calc_metrics(velocity_trades)
-    swing_metrics = calc_metrics(swing_trades)
+    intraday_metrics = calc_metrics(counts[0], wins[0], total_pnl[0])
+    btst_metrics = calc_metrics(counts[1], wins[1], total_pnl[1])
+    velocity_metrics = calc_metrics(counts[2], wins[2], total_pnl[2])
+    swing_metrics = calc_metrics(counts[3], wins[3], total_pnl[3])
     
     # Pure Swing is the aggregate of BTST + Velocity + Swing (all >0 day trades)
-    # Calculate by combining the three categories
-    all_non_intraday = btst_trades + velocity_trades + swing_trades
-    pure_swing_metrics = calc_metrics(all_non_intraday)
+    pure_swing_metrics = calc_metrics(counts[1:].sum(), wins[1:].sum(), total_pnl[1:].sum())
     
-    # Determine best and worst performing styles (only if enough trades)
+    # Determine best and worst performing styles (only if enough trades),
+    # keyed by average P&L so the sort needs no per-item lambda
     styles = []
-    if intraday_metrics['count'] >= 3:
-        styles.append(('Intraday', intraday_metrics))
-    if btst_metrics['count'] >= 3:
-        styles.append(('BTST', btst_metrics))
-    if velocity_metrics['count'] >= 3:
-        styles.append(('Velocity', velocity_metrics))
-    if swing_metrics['count'] >= 3:
-        styles.append(('Swing', swing_metrics))
-    if pure_swing_metrics['count'] >= 3:
-        styles.append(('Pure Swing', pure_swing_metrics))
+    
+    # With fewer than 3 matches no style can qualify; skip the ranking
+    if len(matches) >= 3:
+        candidates = (
+            ('Intraday', intraday_metrics),
+            ('BTST', btst_metrics),
+            ('Velocity', velocity_metrics),
+            ('Swing', swing_metrics),
+            ('Pure Swing', pure_swing_metrics)
+        )
+        styles = [(metrics['avg_pnl'], name, metrics) for name, metrics in candidates if metrics['count'] >= 3]
     
     best_style = None
     worst_style = None
-    recommendations = []
+    styles_sorted = []
     
     if len(styles) >= 2:
-        # Sort by average P&L
-        styles_sorted = sorted(styles, key=lambda x: x[1]['avg_pnl'], reverse=True)
-        best_style = styles_sorted[0][0]
-        worst_style = styles_sorted[-1][0]
-        
-        best_metrics = styles_sorted[0][1]
-        worst_metrics = styles_sorted[-1][1]
-        
-        # Generate recommendations
-        recommendations.append("📊 **Trading Style Performance Analysis:**\n")
-        
-        # Best performing style
-        if best_metrics['avg_pnl'] > 0:
-            recommendations.append(f"✅ **{best_style}** is your most profitable style:")
-            recommendations.append(f"   • Trades: {best_metrics['count']}")
-            recommendations.append(f"   • Win Rate: {best_metrics['win_rate']:.1f}%")
-            recommendations.append(f"   • Avg P&L: ₹{best_metrics['avg_pnl']:.2f}")
-            recommendations.append(f"   💡 **Focus more on {best_style} trades**\n")
-        
-        # Worst performing style
-        if worst_metrics['avg_pnl'] < 0:
-            recommendations.append(f"⚠️ **{worst_style}** is losing money:")
-            recommendations.append(f"   • Trades: {worst_metrics['count']}")
-            recommendations.append(f"   • Win Rate: {worst_metrics['win_rate']:.1f}%")
-            recommendations.append(f"   • Avg P&L: ₹{worst_metrics['avg_pnl']:.2f}")
-            recommendations.append(f"   💡 **Reduce or avoid {worst_style} trades**\n")
-        
-        # Compare all styles
-        recommendations.append("📈 **Profitability Ranking:**")
-        for i, (style, metrics) in enumerate(styles_sorted, 1):
-            emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "📍"
-            recommendations.append(
-                f"{emoji} {style}: ₹{metrics['avg_pnl']:.2f} avg | "
-                f"{metrics['win_rate']:.1f}% win rate | {metrics['count']} trades"
-            )
-    else:
-        recommendations.append("Need more trades across different holding periods for comprehensive analysis")
+        # Sort by average P&L (stable, so ties keep the order above)
+        styles_sorted = sorted(styles, key=itemgetter(0), reverse=True)
+        best_style = styles_sorted[0][1]
+        worst_style = styles_sorted[-1][1]
     
-    recommendation_text = '\n'.join(recommendations) if recommendations else 'Insufficient data for style-based analysis'
+    recommendation_text = _style_recommendation(styles_sorted) if include_recommendation else None
     
     return {
         'sentiment': 'analyzed',
@@ -994,6 +1012,100 @@ def calculate_holding_sentiment(trades: pd.DataFrame) -> Dict[str, Any]:
     }
 
 
+def _win_loss_totals(
+    pnl: np.ndarray,
+    outcome: np.ndarray,
+    in_bucket: Optional[np.ndarray] = None
+) -> Tuple[int, int, int, float, float]:
+    """
+    Count and sum winning and losing trades within a bucket in one pass,
+    reusing outcome codes computed once for all buckets.
+    
+    Args:
+        pnl: P&L per matched trade
+        outcome: OUTCOME_WIN / OUTCOME_LOSS / OUTCOME_FLAT code per trade
+        in_bucket: Mask of trades in the bucket (None for all trades)
+        
+    Returns:
+        tuple: (total_trades, win_count, loss_count, win_sum, loss_sum)
+    """
+    if in_bucket is not None:
+        pnl = pnl[in_bucket]
+        outcome = outcome[in_bucket]
+    
+    counts = np.bincount(outcome, minlength=3)
+    sums = np.bincount(outcome, weights=pnl, minlength=3)
+    
+    return (
+        len(pnl),
+        int(counts[OUTCOME_WIN]),
+        int(counts[OUTCOME_LOSS]),
+        float(sums[OUTCOME_WIN]),
+        float(sums[OUTCOME_LOSS])
+    )
+
+
+def _holding_bucket_totals(trades: pd.DataFrame) -> Dict[str, Tuple[int, int, int, float, float]]:
+    """
+    Win/loss totals of the matched trades for the intraday (same-day),
+    swing (held overnight or longer) and overall buckets, shared by the
+    expectancy and risk-reward calculations.
+    
+    Args:
+        trades: DataFrame with tradebook data
+        
+    Returns:
+        dict: {'intraday': totals, 'swing': totals, 'overall': totals} with
+        totals as returned by _win_loss_totals (empty if nothing matched)
+    """
+    matches = _fifo_match(trades)
+    
+    if len(matches) == 0:
+        return {}
+    
+    days = matches['Holding Days'].to_numpy(dtype=np.int64)
+    pnl = matches['PnL'].to_numpy(dtype=float)
+    
+    # Breakeven (and missing) P&L is neither a win nor a loss
+    outcome = np.where(pnl > 0, OUTCOME_WIN, np.where(pnl < 0, OUTCOME_LOSS, OUTCOME_FLAT))
+    
+    return {
+        'intraday': _win_loss_totals(pnl, outcome, days == 0),
+        'swing': _win_loss_totals(pnl, outcome, days > 0),
+        'overall': _win_loss_totals(pnl, outcome)
+    }
+
+
+def _expectancy_from_totals(
+    total_trades: np.ndarray,
+    win_count: np.ndarray,
+    loss_count: np.ndarray,
+    win_sum: np.ndarray,
+    loss_sum: np.ndarray
+) -> np.ndarray:
+    """
+    Expectancy for many groups of trades at once, from per-group totals.
+    Expectancy = (Win Rate × Avg Win) - (Loss Rate × Avg Loss)
+    
+    Args:
+        total_trades: Trades per group
+        win_count: Winning trades per group
+        loss_count: Losing trades per group
+        win_sum: Total P&L of winning trades per group
+        loss_sum: Total P&L of losing trades per group
+        
+    Returns:
+        np.ndarray: Expectancy per group (NaN for groups with no trades)
+    """
+    size = len(total_trades)
+    win_rate = np.divide(win_count, total_trades, out=np.full(size, np.nan), where=total_trades > 0)
+    loss_rate = np.divide(loss_count, total_trades, out=np.full(size, np.nan), where=total_trades > 0)
+    avg_win = np.divide(win_sum, win_count, out=np.zeros(size), where=win_count > 0)
+    avg_loss = np.abs(np.divide(loss_sum, loss_count, out=np.zeros(size), where=loss_count > 0))
+    
+    return (win_rate * avg_win) - (loss_rate * avg_loss)
+
+
 def calculate_expectancy(trades: pd.DataFrame) -> Dict[str, Dict[str, float]]:
     """
     Calculate expectancy (expected value per trade) for Intraday and Swing separately.
@@ -1016,36 +1128,26 @@ def calculate_expectancy(trades: pd.DataFrame) -> Dict[str, Dict[str, float]]:
             'overall': {'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0}
         }
     
-    # Get matched trades with P&L
-    trade_matches = match_trades_with_pnl(trades)
+    bucket_totals = _holding_bucket_totals(trades)
     
-    if len(trade_matches) == 0:
+    if not bucket_totals:
         return {
             'intraday': {'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0},
             'swing': {'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0},
             'overall': {'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0}
         }
     
-    # Separate intraday and swing trades
-    intraday_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days == 0]
-    swing_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days > 0]
-    
-    def calc_expectancy_for_trades(trade_list):
-        if len(trade_list) == 0:
-            return {'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0, 'win_rate': 0.0, 'loss_rate': 0.0}
+    def calc_expectancy_for_trades(totals):
+        total_trades, win_count, loss_count, win_sum, loss_sum = totals
         
-        wins = [pnl for _, pnl, _ in trade_list if pnl > 0]
-        losses = [pnl for _, pnl, _ in trade_list if pnl < 0]
-        
-        total_trades = len(trade_list)
-        win_count = len(wins)
-        loss_count = len(losses)
+        if total_trades == 0:
+            return {'expectancy': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0, 'win_rate': 0.0, 'loss_rate': 0.0}
         
-        win_rate = win_count / total_trades if total_trades > 0 else 0.0
-        loss_rate = loss_count / total_trades if total_trades > 0 else 0.0
+        win_rate = win_count / total_trades
+        loss_rate = loss_count / total_trades
         
-        avg_win = sum(wins) / win_count if win_count > 0 else 0.0
-        avg_loss = abs(sum(losses) / loss_count) if loss_count > 0 else 0.0
+        avg_win = win_sum / win_count if win_count > 0 else 0.0
+        avg_loss = abs(loss_sum / loss_count) if loss_count > 0 else 0.0
         
         # Expectancy = (Win Rate × Avg Win) - (Loss Rate × Avg Loss)
         expectancy = (win_rate * avg_win) - (loss_rate * avg_loss)
@@ -1058,11 +1160,7 @@ def calculate_expectancy(trades: pd.DataFrame) -> Dict[str, Dict[str, float]]:
             'loss_rate': loss_rate * 100
         }
     
-    return {
-        'intraday': calc_expectancy_for_trades(intraday_trades),
-        'swing': calc_expectancy_for_trades(swing_trades),
-        'overall': calc_expectancy_for_trades(trade_matches)
-    }
+    return {bucket: calc_expectancy_for_trades(totals) for bucket, totals in bucket_totals.items()}
 
 
 def calculate_risk_reward_ratio(trades: pd.DataFrame) -> Dict[str, Dict[str, float]]:
@@ -1086,29 +1184,23 @@ def calculate_risk_reward_ratio(trades: pd.DataFrame) -> Dict[str, Dict[str, flo
             'overall': {'ratio': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0}
         }
     
-    # Get matched trades with P&L
-    trade_matches = match_trades_with_pnl(trades)
+    bucket_totals = _holding_bucket_totals(trades)
     
-    if len(trade_matches) == 0:
+    if not bucket_totals:
         return {
             'intraday': {'ratio': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0},
             'swing': {'ratio': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0},
             'overall': {'ratio': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0}
         }
     
-    # Separate intraday and swing trades
-    intraday_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days == 0]
-    swing_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days > 0]
-    
-    def calc_rr_for_trades(trade_list):
-        if len(trade_list) == 0:
-            return {'ratio': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0}
+    def calc_rr_for_trades(totals):
+        total_trades, win_count, loss_count, win_sum, loss_sum = totals
         
-        wins = [pnl for _, pnl, _ in trade_list if pnl > 0]
-        losses = [pnl for _, pnl, _ in trade_list if pnl < 0]
+        if total_trades == 0:
+            return {'ratio': 0.0, 'avg_win': 0.0, 'avg_loss': 0.0}
         
-        avg_win = sum(wins) / len(wins) if len(wins) > 0 else 0.0
-        avg_loss = abs(sum(losses) / len(losses)) if len(losses) > 0 else 0.0
+        avg_win = win_sum / win_count if win_count > 0 else 0.0
+        avg_loss = abs(loss_sum / loss_count) if loss_count > 0 else 0.0
         
         # Risk-Reward Ratio = Avg Win / Avg Loss
         ratio = avg_win / avg_loss if avg_loss > 0 else float('inf') if avg_win > 0 else 0.0
@@ -1119,11 +1211,7 @@ def calculate_risk_reward_ratio(trades: pd.DataFrame) -> Dict[str, Dict[str, flo
             'avg_loss': avg_loss
         }
     
-    return {
-        'intraday': calc_rr_for_trades(intraday_trades),
-        'swing': calc_rr_for_trades(swing_trades),
-        'overall': calc_rr_for_trades(trade_matches)
-    }
+    return {bucket: calc_rr_for_trades(totals) for bucket, totals in bucket_totals.items()}
 
 
 def calculate_consecutive_streaks(trades: pd.DataFrame) -> Dict[str, Dict[str, Union[int, str]]]:
@@ -1148,9 +1236,9 @@ def calculate_consecutive_streaks(trades: pd.DataFrame) -> Dict[str, Dict[str, U
         }
     
     # Get matched trades with P&L
-    trade_matches = match_trades_with_pnl(trades)
+    matches = _fifo_match(trades)
     
-    if len(trade_matches) == 0:
+    if len(matches) == 0:
         return {
             'intraday': {'max_win_streak': 0, 'max_loss_streak': 0, 'current_streak': 0, 'current_type': 'None'},
             'swing': {'max_win_streak': 0, 'max_loss_streak': 0, 'current_streak': 0, 'current_type': 'None'},
@@ -1158,49 +1246,32 @@ def calculate_consecutive_streaks(trades: pd.DataFrame) -> Dict[str, Dict[str, U
         }
     
     # Separate intraday and swing trades
-    intraday_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days == 0]
-    swing_trades = [(days, pnl, qty) for days, pnl, qty in trade_matches if days > 0]
+    days = matches['Holding Days'].to_numpy(dtype=np.int64)
+    pnl = matches['PnL'].to_numpy(dtype=float)
     
-    def calc_streaks_for_trades(trade_list):
-        if len(trade_list) == 0:
+    def calc_streaks_for_trades(trade_pnl):
+        # Ignore breakeven trades (pnl == 0): they neither extend nor break a streak
+        is_win = trade_pnl[(trade_pnl > 0) | (trade_pnl < 0)] > 0
+        
+        if len(is_win) == 0:
             return {'max_win_streak': 0, 'max_loss_streak': 0, 'current_streak': 0, 'current_type': 'None'}
         
-        max_win_streak = 0
-        max_loss_streak = 0
-        current_streak = 0
-        current_type = None
-        
-        for _, pnl, _ in trade_list:
-            if pnl > 0:  # Win
-                if current_type == 'win':
-                    current_streak += 1
-                else:
-                    current_streak = 1
-                    current_type = 'win'
-                max_win_streak = max(max_win_streak, current_streak)
-            elif pnl < 0:  # Loss
-                if current_type == 'loss':
-                    current_streak += 1
-                else:
-                    current_streak = 1
-                    current_type = 'loss'
-                max_loss_streak = max(max_loss_streak, current_streak)
-            # Ignore breakeven trades (pnl == 0)
-        
-        # Current streak info
-        current_streak_type = current_type.capitalize() if current_type else 'None'
+        # Runs of consecutive wins / losses
+        run_starts = np.flatnonzero(np.concatenate(([True], is_win[1:] != is_win[:-1])))
+        run_lengths = np.diff(np.append(run_starts, len(is_win)))
+        run_is_win = is_win[run_starts]
         
         return {
-            'max_win_streak': max_win_streak,
-            'max_loss_streak': max_loss_streak,
-            'current_streak': current_streak,
-            'current_type': current_streak_type
+            'max_win_streak': int(run_lengths[run_is_win].max(initial=0)),
+            'max_loss_streak': int(run_lengths[~run_is_win].max(initial=0)),
+            'current_streak': int(run_lengths[-1]),
+            'current_type': 'Win' if run_is_win[-1] else 'Loss'
         }
     
     return {
-        'intraday': calc_streaks_for_trades(intraday_trades),
-        'swing': calc_streaks_for_trades(swing_trades),
-        'overall': calc_streaks_for_trades(trade_matches)
+        'intraday': calc_streaks_for_trades(pnl[days == 0]),
+        'swing': calc_streaks_for_trades(pnl[days > 0]),
+        'overall': calc_streaks_for_trades(pnl)
     }
 
 
@@ -1224,142 +1295,43 @@ def calculate_rolling_expectancy(trades: pd.DataFrame, window: Optional[int] = N
     if window is None:
         window = ROLLING_WINDOW_SIZE
     
-    # Get matched trades with P&L and dates
-    trade_matches = []
+    # Matched trades in closing order (by symbol, then sell order)
+    matches = _fifo_match(trades)
     
-    # Group trades by symbol to track dates - sort symbols for deterministic order
-    for symbol in sorted(trades['Symbol'].unique()):
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
-        
-        # Sort by Trade Date and Order Execution Time for proper FIFO matching
-        # Ensure Trade ID is converted to string for consistent sorting
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-        
-        if 'Order Execution Time' in symbol_trades.columns:
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
-            )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-        
-        buy_queue = []
-        
-        for _, trade in symbol_trades.iterrows():
-            trade_date = trade['Trade Date']
-            quantity = trade['Quantity']
-            price = trade['Price']
-            
-            if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-                continue
-                
-            if trade['Trade Type'] == 'buy':
-                buy_queue.append({
-                    'date': trade_date,
-                    'quantity': quantity,
-                    'price': price
-                })
-            elif trade['Trade Type'] == 'sell' and len(buy_queue) > 0:
-                remaining_sell = quantity
-                sell_price = price
-                
-                while remaining_sell > 0 and len(buy_queue) > 0:
-                    buy = buy_queue[0]
-                    buy_date = buy['date']
-                    buy_price = buy['price']
-                    
-                    holding_days = (trade_date - buy_date).days
-                    
-                    if holding_days < 0:
-                        buy_queue.pop(0)
-                        continue
-                    
-                    if buy['quantity'] <= remaining_sell:
-                        matched_qty = buy['quantity']
-                        pnl = (sell_price - buy_price) * matched_qty
-                        trade_matches.append({
-                            'date': trade_date,
-                            'holding_days': holding_days,
-                            'pnl': pnl,
-                            'qty': matched_qty
-                        })
-                        remaining_sell -= matched_qty
-                        buy_queue.pop(0)
-                    else:
-                        matched_qty = remaining_sell
-                        pnl = (sell_price - buy_price) * matched_qty
-                        trade_matches.append({
-                            'date': trade_date,
-                            'holding_days': holding_days,
-                            'pnl': pnl,
-                            'qty': matched_qty
-                        })
-                        buy['quantity'] -= matched_qty
-                        remaining_sell = 0
-    
-    if len(trade_matches) < window:
+    if len(matches) < window:
         return pd.DataFrame(columns=['trade_number', 'date', 'expectancy_overall', 
                                      'expectancy_intraday', 'expectancy_swing'])
     
-    # Sort by date
-    trade_matches_df = pd.DataFrame(trade_matches).sort_values('date')
-    
-    # Calculate rolling expectancy
-    rolling_data = []
-    
-    for i in range(window, len(trade_matches) + 1):
-        window_trades = trade_matches[i-window:i]
-        
-        # Overall expectancy for window
-        wins = [t['pnl'] for t in window_trades if t['pnl'] > 0]
-        losses = [t['pnl'] for t in window_trades if t['pnl'] < 0]
-        
-        win_rate = len(wins) / len(window_trades) if len(window_trades) > 0 else 0
-        loss_rate = len(losses) / len(window_trades) if len(window_trades) > 0 else 0
-        avg_win = sum(wins) / len(wins) if len(wins) > 0 else 0
-        avg_loss = abs(sum(losses) / len(losses)) if len(losses) > 0 else 0
-        expectancy_overall = (win_rate * avg_win) - (loss_rate * avg_loss)
-        
-        # Intraday expectancy for window
-        intraday_window = [t for t in window_trades if t['holding_days'] == 0]
-        if len(intraday_window) > 0:
-            wins_id = [t['pnl'] for t in intraday_window if t['pnl'] > 0]
-            losses_id = [t['pnl'] for t in intraday_window if t['pnl'] < 0]
-            win_rate_id = len(wins_id) / len(intraday_window)
-            loss_rate_id = len(losses_id) / len(intraday_window)
-            avg_win_id = sum(wins_id) / len(wins_id) if len(wins_id) > 0 else 0
-            avg_loss_id = abs(sum(losses_id) / len(losses_id)) if len(losses_id) > 0 else 0
-            expectancy_intraday = (win_rate_id * avg_win_id) - (loss_rate_id * avg_loss_id)
-        else:
-            expectancy_intraday = None
-        
-        # Swing expectancy for window
-        swing_window = [t for t in window_trades if t['holding_days'] > 0]
-        if len(swing_window) > 0:
-            wins_sw = [t['pnl'] for t in swing_window if t['pnl'] > 0]
-            losses_sw = [t['pnl'] for t in swing_window if t['pnl'] < 0]
-            win_rate_sw = len(wins_sw) / len(swing_window)
-            loss_rate_sw = len(losses_sw) / len(swing_window)
-            avg_win_sw = sum(wins_sw) / len(wins_sw) if len(wins_sw) > 0 else 0
-            avg_loss_sw = abs(sum(losses_sw) / len(losses_sw)) if len(losses_sw) > 0 else 0
-            expectancy_swing = (win_rate_sw * avg_win_sw) - (loss_rate_sw * avg_loss_sw)
-        else:
-            expectancy_swing = None
-        
-        rolling_data.append({
-            'trade_number': i,
-            'date': window_trades[-1]['date'],
-            'expectancy_overall': expectancy_overall,
-            'expectancy_intraday': expectancy_intraday,
-            'expectancy_swing': expectancy_swing
-        })
-    
-    return pd.DataFrame(rolling_data)
+    days = matches['Holding Days'].to_numpy(dtype=np.int64)
+    pnl = matches['PnL'].to_numpy(dtype=float)
+    
+    is_win = pnl > 0
+    is_loss = pnl < 0
+    
+    def windowed(values):
+        # Sum over every run of `window` consecutive matches
+        totals = np.concatenate(([0], np.cumsum(values)))
+        return totals[window:] - totals[:-window]
+    
+    def rolling_expectancy(in_bucket):
+        wins = is_win & in_bucket
+        losses = is_loss & in_bucket
+        return _expectancy_from_totals(
+            windowed(in_bucket),
+            windowed(wins),
+            windowed(losses),
+            windowed(np.where(wins, pnl, 0.0)),
+            windowed(np.where(losses, pnl, 0.0))
+        )
+    
+    # Window ending at match i (1-based) is labelled with that match's date
+    return pd.DataFrame({
+        'trade_number': np.arange(window, len(pnl) + 1),
+        'date': matches['Sell Date'].to_numpy()[window - 1:],
+        'expectancy_overall': rolling_expectancy(np.ones(len(pnl), dtype=bool)),
+        'expectancy_intraday': rolling_expectancy(days == 0),
+        'expectancy_swing': rolling_expectancy(days > 0)
+    })
 
 
 def calculate_monthly_expectancy(trades: pd.DataFrame) -> pd.DataFrame:
@@ -1379,146 +1351,49 @@ def calculate_monthly_expectancy(trades: pd.DataFrame) -> pd.DataFrame:
                                      'expectancy_swing', 'trade_count_overall',
                                      'trade_count_intraday', 'trade_count_swing'])
     
-    # Get matched trades with P&L and dates
-    trade_matches = []
+    # Matched trades with P&L and sell dates
+    matches = _fifo_match(trades)
     
-    # Sort symbols for deterministic processing order
-    for symbol in sorted(trades['Symbol'].unique()):
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
-        
-        # Ensure Trade ID is converted to string for consistent sorting
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-        
-        if 'Order Execution Time' in symbol_trades.columns:
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
-            )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-        
-        buy_queue = []
-        
-        for _, trade in symbol_trades.iterrows():
-            trade_date = trade['Trade Date']
-            quantity = trade['Quantity']
-            price = trade['Price']
-            
-            if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-                continue
-                
-            if trade['Trade Type'] == 'buy':
-                buy_queue.append({
-                    'date': trade_date,
-                    'quantity': quantity,
-                    'price': price
-                })
-            elif trade['Trade Type'] == 'sell' and len(buy_queue) > 0:
-                remaining_sell = quantity
-                sell_price = price
-                
-                while remaining_sell > 0 and len(buy_queue) > 0:
-                    buy = buy_queue[0]
-                    buy_date = buy['date']
-                    buy_price = buy['price']
-                    
-                    holding_days = (trade_date - buy_date).days
-                    
-                    if holding_days < 0:
-                        buy_queue.pop(0)
-                        continue
-                    
-                    if buy['quantity'] <= remaining_sell:
-                        matched_qty = buy['quantity']
-                        pnl = (sell_price - buy_price) * matched_qty
-                        trade_matches.append({
-                            'date': trade_date,
-                            'month': trade_date.to_period('M'),
-                            'holding_days': holding_days,
-                            'pnl': pnl
-                        })
-                        remaining_sell -= matched_qty
-                        buy_queue.pop(0)
-                    else:
-                        matched_qty = remaining_sell
-                        pnl = (sell_price - buy_price) * matched_qty
-                        trade_matches.append({
-                            'date': trade_date,
-                            'month': trade_date.to_period('M'),
-                            'holding_days': holding_days,
-                            'pnl': pnl
-                        })
-                        buy['quantity'] -= matched_qty
-                        remaining_sell = 0
-    
-    if len(trade_matches) == 0:
+    if len(matches) == 0:
         return pd.DataFrame(columns=['month', 'expectancy_overall', 'expectancy_intraday', 
                                      'expectancy_swing', 'trade_count_overall',
                                      'trade_count_intraday', 'trade_count_swing'])
     
-    # Group by month
-    df = pd.DataFrame(trade_matches)
-    monthly_data = []
-    
-    for month in df['month'].unique():
-        month_trades = df[df['month'] == month]
-        
-        # Overall
-        wins = month_trades[month_trades['pnl'] > 0]['pnl']
-        losses = month_trades[month_trades['pnl'] < 0]['pnl']
-        win_rate = len(wins) / len(month_trades)
-        loss_rate = len(losses) / len(month_trades)
-        avg_win = wins.mean() if len(wins) > 0 else 0
-        avg_loss = abs(losses.mean()) if len(losses) > 0 else 0
-        expectancy_overall = (win_rate * avg_win) - (loss_rate * avg_loss)
-        
-        # Intraday
-        intraday = month_trades[month_trades['holding_days'] == 0]
-        if len(intraday) > 0:
-            wins_id = intraday[intraday['pnl'] > 0]['pnl']
-            losses_id = intraday[intraday['pnl'] < 0]['pnl']
-            win_rate_id = len(wins_id) / len(intraday)
-            loss_rate_id = len(losses_id) / len(intraday)
-            avg_win_id = wins_id.mean() if len(wins_id) > 0 else 0
-            avg_loss_id = abs(losses_id.mean()) if len(losses_id) > 0 else 0
-            expectancy_intraday = (win_rate_id * avg_win_id) - (loss_rate_id * avg_loss_id)
-            count_intraday = len(intraday)
-        else:
-            expectancy_intraday = None
-            count_intraday = 0
-        
-        # Swing
-        swing = month_trades[month_trades['holding_days'] > 0]
-        if len(swing) > 0:
-            wins_sw = swing[swing['pnl'] > 0]['pnl']
-            losses_sw = swing[swing['pnl'] < 0]['pnl']
-            win_rate_sw = len(wins_sw) / len(swing)
-            loss_rate_sw = len(losses_sw) / len(swing)
-            avg_win_sw = wins_sw.mean() if len(wins_sw) > 0 else 0
-            avg_loss_sw = abs(losses_sw.mean()) if len(losses_sw) > 0 else 0
-            expectancy_swing = (win_rate_sw * avg_win_sw) - (loss_rate_sw * avg_loss_sw)
-            count_swing = len(swing)
-        else:
-            expectancy_swing = None
-            count_swing = 0
-        
-        monthly_data.append({
-            'month': month.to_timestamp(),
-            'expectancy_overall': expectancy_overall,
-            'expectancy_intraday': expectancy_intraday,
-            'expectancy_swing': expectancy_swing,
-            'trade_count_overall': len(month_trades),
-            'trade_count_intraday': count_intraday,
-            'trade_count_swing': count_swing
-        })
-    
-    result = pd.DataFrame(monthly_data).sort_values('month')
-    return result
+    days = matches['Holding Days'].to_numpy(dtype=np.int64)
+    pnl = matches['PnL'].to_numpy(dtype=float)
+    
+    is_win = pnl > 0
+    is_loss = pnl < 0
+    
+    # Truncate all sell dates to month starts in one cast, then number the months
+    month_starts = matches['Sell Date'].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
+    month_codes, months = pd.factorize(month_starts, sort=True)
+    
+    def monthly_totals(in_bucket):
+        wins = is_win & in_bucket
+        losses = is_loss & in_bucket
+        return (
+            np.bincount(month_codes[in_bucket], minlength=len(months)),
+            np.bincount(month_codes[wins], minlength=len(months)),
+            np.bincount(month_codes[losses], minlength=len(months)),
+            np.bincount(month_codes, weights=np.where(wins, pnl, 0.0), minlength=len(months)),
+            np.bincount(month_codes, weights=np.where(losses, pnl, 0.0), minlength=len(months))
+        )
+    
+    overall = monthly_totals(np.ones(len(pnl), dtype=bool))
+    intraday = monthly_totals(days == 0)
+    swing = monthly_totals(days > 0)
+    
+    # Months without intraday (or swing) trades have a missing expectancy
+    return pd.DataFrame({
+        'month': months,
+        'expectancy_overall': _expectancy_from_totals(*overall),
+        'expectancy_intraday': _expectancy_from_totals(*intraday),
+        'expectancy_swing': _expectancy_from_totals(*swing),
+        'trade_count_overall': overall[0],
+        'trade_count_intraday': intraday[0],
+        'trade_count_swing': swing[0]
+    })
 
 
 def calculate_cumulative_metrics(trades: pd.DataFrame) -> pd.DataFrame:
@@ -1537,47 +1412,39 @@ def calculate_cumulative_metrics(trades: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame(columns=['trade_number', 'date', 'win_rate', 'profit_factor',
                                      'risk_reward', 'expectancy'])
     
-    # Get matched trades with P&L
-    trade_matches = match_trades_with_pnl(trades)
+    # P&L of each matched trade, in closing order
+    pnl = _fifo_match(trades)['PnL'].to_numpy(dtype=float)
     
-    if len(trade_matches) == 0:
+    if len(pnl) == 0:
         return pd.DataFrame(columns=['trade_number', 'date', 'win_rate', 'profit_factor',
                                      'risk_reward', 'expectancy'])
     
-    cumulative_data = []
-    
-    for i in range(1, len(trade_matches) + 1):
-        subset = trade_matches[:i]
-        
-        # Win Rate
-        wins = [pnl for _, pnl, _ in subset if pnl > 0]
-        losses = [pnl for _, pnl, _ in subset if pnl < 0]
-        win_rate = (len(wins) / i) * 100
-        
-        # Profit Factor
-        gross_profit = sum(wins) if len(wins) > 0 else 0
-        gross_loss = abs(sum(losses)) if len(losses) > 0 else 0
-        profit_factor = gross_profit / gross_loss if gross_loss > 0 else (float('inf') if gross_profit > 0 else 0)
-        
-        # Risk-Reward Ratio
-        avg_win = sum(wins) / len(wins) if len(wins) > 0 else 0
-        avg_loss = abs(sum(losses) / len(losses)) if len(losses) > 0 else 0
-        risk_reward = avg_win / avg_loss if avg_loss > 0 else (float('inf') if avg_win > 0 else 0)
-        
-        # Expectancy
-        win_rate_decimal = len(wins) / i
-        loss_rate_decimal = len(losses) / i
-        expectancy = (win_rate_decimal * avg_win) - (loss_rate_decimal * avg_loss)
-        
-        cumulative_data.append({
-            'trade_number': i,
-            'win_rate': win_rate,
-            'profit_factor': profit_factor if profit_factor != float('inf') else None,
-            'risk_reward': risk_reward if risk_reward != float('inf') else None,
-            'expectancy': expectancy
-        })
-    
-    return pd.DataFrame(cumulative_data)
+    # Running counts and sums over every prefix of the matches
+    trade_number = np.arange(1, len(pnl) + 1)
+    is_win = pnl > 0
+    is_loss = pnl < 0
+    win_count = np.cumsum(is_win)
+    loss_count = np.cumsum(is_loss)
+    gross_profit = np.cumsum(np.where(is_win, pnl, 0.0))
+    gross_loss = -np.cumsum(np.where(is_loss, pnl, 0.0))
+    
+    def ratio(numerator, denominator):
+        # Undefined ratios (nothing to divide by) are None if the numerator
+        # is positive (would be infinite), else 0
+        result = np.where(numerator > 0, np.nan, 0.0)
+        np.divide(numerator, denominator, out=result, where=denominator > 0)
+        return result
+    
+    avg_win = np.divide(gross_profit, win_count, out=np.zeros(len(pnl)), where=win_count > 0)
+    avg_loss = np.divide(gross_loss, loss_count, out=np.zeros(len(pnl)), where=loss_count > 0)
+    
+    return pd.DataFrame({
+        'trade_number': trade_number,
+        'win_rate': (win_count / trade_number) * 100,
+        'profit_factor': ratio(gross_profit, gross_loss),
+        'risk_reward': ratio(avg_win, avg_loss),
+        'expectancy': (win_count / trade_number) * avg_win - (loss_count / trade_number) * avg_loss
+    })
 
 
 def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Optional[Callable[[int, str], None]] = None, fetch_function: Optional[Callable[[str, str, str, str], pd.DataFrame]] = None) -> pd.DataFrame:
@@ -1619,6 +1486,15 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
     # Helper function to fetch historical data (with caching support)
     def fetch_hist_data(symbol, start_date, end_date, interval):
         """Fetch historical data, using cached function if provided"""
+        # Symbol spellings to try, skipping ones identical to an earlier
+        # variant (already upper-case, no spaces) to avoid repeat requests
+        symbol_variants = list(dict.fromkeys([
+            f"{symbol}-EQ",
+            symbol,
+            symbol.upper(),
+            symbol.replace(' ', ''),
+        ]))
+        
         if fetch_function:
             # Normalize dates to date-only strings for consistent cache keys
             # This ensures the same cache key regardless of date object type
@@ -1637,12 +1513,6 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
                 end_date_normalized = pd.to_datetime(end_date).date().isoformat()
             
             # Use cached function from Streamlit with normalized dates
-            symbol_variants = [
-                f"{symbol}-EQ",
-                symbol,
-                symbol.upper(),
-                symbol.replace(' ', ''),
-            ]
             for chart_symbol in symbol_variants:
                 try:
                     hist_data = fetch_function(chart_symbol, start_date_normalized, end_date_normalized, interval)
@@ -1654,12 +1524,6 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
             return pd.DataFrame(), None
         else:
             # Direct fetch without cache
-            symbol_variants = [
-                f"{symbol}-EQ",
-                symbol,
-                symbol.upper(),
-                symbol.replace(' ', ''),
-            ]
             for chart_symbol in symbol_variants:
                 try:
                     hist_data = openchart_nse.historical(
@@ -1670,7 +1534,7 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
                         interval=interval
                     )
                     if not hist_data.empty:
-                        hist_data.columns = [col.title() for col in hist_data.columns]
+                        normalize_history_columns(hist_data)
                         if 'Open' in hist_data.columns and 'High' in hist_data.columns:
                             return hist_data, chart_symbol
                 except Exception as e:
@@ -1682,111 +1546,44 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
     if progress_callback:
         progress_callback(PROGRESS_MATCHING, "Matching buy-sell pairs...")
     
-    trade_pairs = []  # List of (buy_trade, sell_trade, symbol) tuples
-    # Sort symbols for deterministic processing order
-    unique_symbols = sorted(trades['Symbol'].unique())
+    # Pairs come from the shared FIFO match table: one per (sell, buy lot).
+    # For MAE/MFE a partially used buy lot still counts as the full entry.
+    matches = _fifo_match(trades)
     
-    for symbol in unique_symbols:
-        symbol_trades = trades[trades['Symbol'] == symbol].copy()
-        
-        # Sort by date and execution time
-        # Ensure Trade ID is converted to string for consistent sorting
-        if 'Trade ID' in symbol_trades.columns:
-            symbol_trades['Trade ID'] = symbol_trades['Trade ID'].astype(str)
-        
-        if 'Order Execution Time' in symbol_trades.columns:
-            symbol_trades['ExecTime'] = pd.to_datetime(
-                symbol_trades['Order Execution Time'], 
-                errors='coerce'
-            )
-            symbol_trades = symbol_trades.sort_values(
-                ['Trade Date', 'ExecTime', 'Trade ID'],
-                na_position='last'
-            )
-        else:
-            symbol_trades = symbol_trades.sort_values(['Trade Date', 'Trade ID'])
-        
-        buy_queue = []  # List of {date, quantity, price, trade_dict}
-        for idx, trade_row in symbol_trades.iterrows():
-            trade_date = trade_row['Trade Date']
-            quantity = trade_row['Quantity']
-            price = trade_row['Price']
-            
-            if pd.isna(trade_date) or pd.isna(quantity) or pd.isna(price):
-                continue
-            
-            trade = trade_row.to_dict()
-            
-            if trade.get('Trade Type') == 'buy':
-                # Store date directly from DataFrame (same as match_trades_with_pnl)
-                buy_queue.append({
-                    'date': trade_date,
-                    'quantity': quantity,
-                    'price': price,
-                    'trade_dict': trade
-                })
-            elif trade.get('Trade Type') == 'sell' and len(buy_queue) > 0:
-                # Match sell with earliest buy (FIFO) - same logic as match_trades_with_pnl
-                remaining_sell = quantity
-                sell_price = price
-                
-                while remaining_sell > 0 and len(buy_queue) > 0:
-                    buy = buy_queue[0]
-                    buy_date = buy['date']
-                    buy_price = buy['price']
-                    
-                    # Calculate holding days using same logic as match_trades_with_pnl
-                    # Use dates directly from DataFrame (not converted to date objects)
-                    holding_days = (trade_date - buy_date).days
-                    
-                    # Ensure holding days is non-negative
-                    if holding_days < 0:
-                        buy_queue.pop(0)
-                        continue
-                    
-                    if buy['quantity'] <= remaining_sell:
-                        # Use entire buy trade
-                        matched_qty = buy['quantity']
-                        trade_pairs.append((buy['trade_dict'], trade, symbol, holding_days))
-                        remaining_sell -= matched_qty
-                        buy_queue.pop(0)
-                    else:
-                        # Use partial buy trade - for MAE/MFE, we'll use the full buy trade
-                        # (since we need complete trade pairs for price data)
-                        matched_qty = remaining_sell
-                        trade_pairs.append((buy['trade_dict'], trade, symbol, holding_days))
-                        buy['quantity'] -= matched_qty
-                        remaining_sell = 0
-    
-    total_pairs = len(trade_pairs)
+    total_pairs = len(matches)
     if total_pairs == 0:
         return pd.DataFrame()
     
     if progress_callback:
         progress_callback(PROGRESS_PREPARE, f"Found {total_pairs} trade pairs. Preparing parallel fetch...")
     
-    # Step 2: Prepare fetch requests
-    fetch_requests = []
-    for buy_trade, sell_trade, symbol, holding_days in trade_pairs:
-        # Get dates from trade dictionaries (already in correct format from DataFrame)
-        buy_trade_date = buy_trade.get('Trade Date')
-        sell_trade_date = sell_trade.get('Trade Date')
-        
-        # Convert to datetime for API calls (needed for openchart)
-        start_date = pd.to_datetime(buy_trade_date)
-        end_date = pd.to_datetime(sell_trade_date)
-        
+    # Pairs without positive entry and exit prices give no MAE/MFE
+    # percentages: drop them (NaN included) so their history is never fetched
+    matches = matches[(matches['Buy Price'] > 0) & (matches['Sell Price'] > 0)]
+    
+    # Step 2: Prepare fetch requests, one per symbol and date range: pairs
+    # sharing them (e.g. a sell closing several lots bought the same day)
+    # need the same price history, so it is fetched once for all of them
+    fetch_requests = {}
+    for symbol, start_date, end_date, holding_days, buy_price, sell_price in zip(
+        matches['Symbol'], matches['Buy Date'], matches['Sell Date'],
+        matches['Holding Days'], matches['Buy Price'], matches['Sell Price']
+    ):
         interval = '5m' if holding_days == 0 else '1d'
-        
-        fetch_requests.append({
-            'symbol': symbol,
-            'start_date': start_date,
-            'end_date': end_date,
-            'interval': interval,
-            'buy_trade': buy_trade,
-            'sell_trade': sell_trade,
-            'holding_days': holding_days  # Already calculated using same logic as match_trades_with_pnl
-        })
+        key = (symbol, start_date, end_date, interval)
+        
+        if key not in fetch_requests:
+            fetch_requests[key] = {
+                'symbol': symbol,
+                'start_date': start_date,
+                'end_date': end_date,
+                'interval': interval,
+                'holding_days': holding_days,
+                'pairs': []  # (buy_price, sell_price) of each trade pair
+            }
+        fetch_requests[key]['pairs'].append((buy_price, sell_price))
+    
+    total_fetches = len(fetch_requests)
     
     # Step 3: Parallel fetch using ThreadPoolExecutor (Optimization 3: Batch Requests)
     def fetch_single_request(request):
@@ -1824,7 +1621,7 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
         # Submit all fetch requests
         future_to_request = {
             executor.submit(fetch_single_request, req): req 
-            for req in fetch_requests
+            for req in fetch_requests.values()
         }
         
         # Process completed fetches as they come in
@@ -1834,11 +1631,11 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
             request = result['request']
             
             # Update progress
-            if progress_callback and total_pairs > 0:
-                fetch_progress = PROGRESS_FETCH_START + int((completed_fetches / total_pairs) * PROGRESS_FETCH_RANGE)
+            if progress_callback and total_fetches > 0:
+                fetch_progress = PROGRESS_FETCH_START + int((completed_fetches / total_fetches) * PROGRESS_FETCH_RANGE)
                 progress_callback(
                     fetch_progress, 
-                    f"Fetched {completed_fetches}/{total_pairs} trades..."
+                    f"Fetched {completed_fetches}/{total_fetches} price histories..."
                 )
             
             if not result['success']:
@@ -1848,110 +1645,98 @@ def calculate_mae_mfe_for_trades(trades: pd.DataFrame, progress_callback: Option
                 continue
             
             hist_data = result['hist_data']
-            buy_trade = request['buy_trade']
-            sell_trade = request['sell_trade']
             symbol = request['symbol']
             holding_days = request['holding_days']
             
+            # Ensure we have required columns
+            if not HISTORY_REQUIRED_COLUMNS.issubset(hist_data.columns):
+                continue
+            
+            # Lowest and highest prices during the trade period, shared by
+            # every pair on this history
             try:
-                buy_price = buy_trade.get('Price', 0)
-                sell_price = sell_trade.get('Price', 0)
-                
-                # Validate prices are valid and positive
-                if buy_price <= 0 or sell_price <= 0 or pd.isna(buy_price) or pd.isna(sell_price):
-                    continue
-                
-                # Ensure we have required columns
-                required_cols = ['Low', 'High']
-                if not all(col in hist_data.columns for col in required_cols):
-                    continue
-                
-                # Get lowest and highest prices during the trade period
                 lowest_price = hist_data['Low'].min()
                 highest_price = hist_data['High'].max()
-                
-                # Validate historical data
-                if pd.isna(lowest_price) or pd.isna(highest_price) or lowest_price <= 0 or highest_price <= 0:
-                    continue
-                
-                # Calculate MAE and MFE
-                # MAE: Maximum Adverse Excursion (how far price went AGAINST you)
-                # For long positions: price can only go down from entry, so MAE should be >= 0
-                # If lowest_price > buy_price, it means price never went below entry (MAE = 0)
-                # This can happen if historical data doesn't include the exact entry time
-                mae = max(0, buy_price - lowest_price)  # Ensure MAE is never negative
-                
-                # MFE: Maximum Favorable Excursion (how far price went IN YOUR FAVOR)
-                # For long positions: price can only go up from entry, so MFE should be >= 0
-                # If highest_price < buy_price, it means price never went above entry (MFE = 0)
-                # This is rare but possible if price only moved down
-                mfe = max(0, highest_price - buy_price)  # Ensure MFE is never negative
-                
-                # Calculate percentages (safeguard against division by zero)
-                mae_pct = (mae / buy_price) * 100 if buy_price > 0 else 0
-                mfe_pct = (mfe / buy_price) * 100 if buy_price > 0 else 0
-                
-                # Calculate exit P&L
-                exit_pnl = sell_price - buy_price
-                exit_pnl_pct = (exit_pnl / buy_price) * 100 if buy_price > 0 else 0
-                
-                # Calculate exit efficiency (only for winners with positive MFE)
-                # Efficiency = (Actual P&L / Maximum Favorable Excursion) * 100
-                # This shows what % of available profit you captured
-                exit_efficiency = (exit_pnl / mfe * 100) if (mfe > 0 and exit_pnl > 0) else 0
-                
-                # Clamp efficiency to reasonable range (0-100%)
-                # If efficiency > 100%, it means you captured more than MFE (data issue or edge case)
-                exit_efficiency = min(100, max(0, exit_efficiency))
-                
-                # Additional validation: Ensure calculated values are reasonable
-                # MAE and MFE percentages should be reasonable (e.g., < 100% for most stocks)
-                # Very high values (>100%) might indicate data errors, but we'll keep them
-                # as they could be legitimate for highly volatile stocks or data gaps
-                # The max(0, ...) ensures they're at least non-negative
-                
-                start_date = request['start_date']
-                end_date = request['end_date']
-                
-                mae_mfe_results.append({
-                    'Symbol': symbol,
-                    'Entry Date': start_date.date() if hasattr(start_date, 'date') else start_date,
-                    'Exit Date': end_date.date() if hasattr(end_date, 'date') else end_date,
-                    'Entry Price': buy_price,
-                    'Exit Price': sell_price,
-                    'Lowest Price': lowest_price,
-                    'Highest Price': highest_price,
-                    'MAE %': mae_pct,
-                    'MFE %': mfe_pct,
-                    'Exit P&L %': exit_pnl_pct,
-                    'Exit Efficiency %': exit_efficiency,
-                    'Holding Days': holding_days,
-                    'Data Source': 'openchart'
-                })
             except Exception as e:
                 logger.error(f"Error processing {symbol} trade: {e}")
                 continue
-    
-    result_df = pd.DataFrame(mae_mfe_results)
+            
+            # Validate historical data
+            if pd.isna(lowest_price) or pd.isna(highest_price) or lowest_price <= 0 or highest_price <= 0:
+                continue
+            
+            for buy_price, sell_price in request['pairs']:
+                mae_mfe_results.append((
+                    symbol, request['start_date'], request['end_date'], buy_price, sell_price,
+                    lowest_price, highest_price, holding_days
+                ))
+    
+    if len(mae_mfe_results) > 0:
+        (symbols, entry_dates, exit_dates, buy_price, sell_price,
+         lowest_price, highest_price, holding_days) = zip(*mae_mfe_results)
+        buy_price = np.asarray(buy_price, dtype=float)
+        sell_price = np.asarray(sell_price, dtype=float)
+        lowest_price = np.asarray(lowest_price, dtype=float)
+        highest_price = np.asarray(highest_price, dtype=float)
+        
+        # MAE: Maximum Adverse Excursion (how far price went AGAINST you)
+        # For long positions: price can only go down from entry, so MAE should be >= 0
+        # If lowest_price > buy_price, it means price never went below entry (MAE = 0)
+        # This can happen if historical data doesn't include the exact entry time
+        mae = np.maximum(0, buy_price - lowest_price)
+        
+        # MFE: Maximum Favorable Excursion (how far price went IN YOUR FAVOR)
+        # If highest_price < buy_price, it means price never went above entry (MFE = 0)
+        mfe = np.maximum(0, highest_price - buy_price)
+        
+        # Calculate exit P&L (buy prices were validated as positive above)
+        exit_pnl = sell_price - buy_price
+        
+        # Exit efficiency (only for winners with positive MFE): what % of the
+        # available profit was captured, clamped to 0-100% (above 100% means
+        # the history missed the exit price)
+        exit_efficiency = np.zeros(len(exit_pnl))
+        np.divide(exit_pnl, mfe, out=exit_efficiency, where=(mfe > 0) & (exit_pnl > 0))
+        exit_efficiency = np.clip(exit_efficiency * 100, 0, 100)
+        
+        # MAE/MFE percentages above 100% are kept: they may be data gaps, but
+        # can be legitimate for highly volatile stocks
+        result_df = pd.DataFrame({
+            'Symbol': symbols,
+            'Entry Date': pd.DatetimeIndex(entry_dates).date,
+            'Exit Date': pd.DatetimeIndex(exit_dates).date,
+            'Entry Price': buy_price,
+            'Exit Price': sell_price,
+            'Lowest Price': lowest_price,
+            'Highest Price': highest_price,
+            'MAE %': (mae / buy_price) * 100,
+            'MFE %': (mfe / buy_price) * 100,
+            'Exit P&L %': (exit_pnl / buy_price) * 100,
+            'Exit Efficiency %': exit_efficiency,
+            'Holding Days': np.asarray(holding_days, dtype=np.int64),
+            'Data Source': 'openchart'
+        })
+    else:
+        result_df = pd.DataFrame()
     
     # Debug: Log summary
     if len(result_df) == 0:
         logger.warning(f"No MAE/MFE data calculated. Processed {len(trades)} trades.")
+    
+    # Side counts rescan the whole tradebook, so only build them when shown
+    if len(result_df) == 0 and logger.isEnabledFor(logging.DEBUG):
         logger.debug(f"Unique symbols: {list(trades['Symbol'].unique()[:10])}")  # Show first 10 symbols
         
-        # Count buy/sell pairs
-        buy_count = len(trades[trades['Trade Type'].str.lower() == 'buy'])
-        sell_count = len(trades[trades['Trade Type'].str.lower() == 'sell'])
-        logger.debug(f"Buy trades: {buy_count}, Sell trades: {sell_count}")
-        
-        # Check if we have matched pairs
-        matched_pairs = 0
-        # Sort symbols for deterministic processing order
-        for symbol in sorted(trades['Symbol'].unique()):
-            symbol_trades = trades[trades['Symbol'] == symbol]
-            buys = symbol_trades[symbol_trades['Trade Type'].str.lower() == 'buy']
-            sells = symbol_trades[symbol_trades['Trade Type'].str.lower() == 'sell']
-            matched_pairs += min(len(buys), len(sells))
+        # Count buy/sell pairs (lower-cased once)
+        trade_type = trades['Trade Type'].str.lower()
+        side_counts = pd.DataFrame({
+            'buy': (trade_type == 'buy').to_numpy(),
+            'sell': (trade_type == 'sell').to_numpy()
+        }).groupby(trades['Symbol'].to_numpy()).sum()
+        logger.debug(f"Buy trades: {int(side_counts['buy'].sum())}, Sell trades: {int(side_counts['sell'].sum())}")
+        
+        # Check if we have matched pairs (min of buys and sells per symbol)
+        matched_pairs = int(side_counts.min(axis=1).sum())
         logger.debug(f"Potential matched pairs: {matched_pairs}")
     
     return result_df
@@ -70,11 +70,18 @@ def get_sectors_for_symbols(
         from concurrent.futures import ThreadPoolExecutor, as_completed
         import threading
         
-        sector_map = {}
-        total = len(symbols)
-        completed = 0
+        # Symbols looked up before are answered from the cache without a request
+        sector_map = {symbol: _sector_cache[symbol] for symbol in symbols if symbol in _sector_cache}
+        to_fetch = [symbol for symbol in dict.fromkeys(symbols) if symbol not in sector_map]
+        total = len(sector_map) + len(to_fetch)
+        completed = len(sector_map)
         lock = threading.Lock()
         
+        if not to_fetch:
+            if progress_callback and total > 0:
+                progress_callback(completed, total)
+            return sector_map
+        
         def fetch_with_progress(symbol):
             """Fetch sector and update progress"""
             sector = get_stock_sector(symbol)
@@ -82,11 +89,11 @@ def get_sectors_for_symbols(
         
         # Use parallel processing with max workers from config
         from config import THREAD_POOL_MAX_WORKERS
-        max_workers = min(THREAD_POOL_MAX_WORKERS, len(symbols))
+        max_workers = min(THREAD_POOL_MAX_WORKERS, len(to_fetch))
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             # Submit all tasks
-            future_to_symbol = {executor.submit(fetch_with_progress, symbol): symbol for symbol in symbols}
+            future_to_symbol = {executor.submit(fetch_with_progress, symbol): symbol for symbol in to_fetch}
             
             # Process completed tasks
             for future in as_completed(future_to_symbol):
@@ -0,0 +1,22 @@
+"""
+Tests for normalizing the column casing of fetched price history
+"""
+
+import unittest
+
+import pandas as pd
+
+from services import metrics_calculator as mc
+
+
+class NormalizeHistoryColumnsTest(unittest.TestCase):
+    def test_any_casing_maps_to_title_case(self):
+        hist_data = pd.DataFrame(columns=['open', 'HIGH', 'Low', 'cLoSe', 'volume', 'timestamp'])
+        self.assertEqual(
+            list(mc.normalize_history_columns(hist_data).columns),
+            ['Open', 'High', 'Low', 'Close', 'Volume', 'timestamp']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()